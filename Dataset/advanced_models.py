@@ -1,48 +1,19 @@
+import argparse
+import json
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.multioutput import MultiOutputRegressor
 import joblib
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import load_training_data
+from parallel_training import train
 from xgboost import XGBRegressor
 from catboost import CatBoostRegressor
 from lightgbm import LGBMRegressor
 
-# 1. Load data and feature engineering (must match training)
-def feature_engineering(df):
-    total = df['Recommended_Carbs'] + df['Recommended_Protein'] + df['Recommended_Fats']
-    total = total.replace(0, pd.NA)
-    df['Carb_ratio'] = df['Recommended_Carbs'] / total
-    df['Protein_ratio'] = df['Recommended_Protein'] / total
-    df['Fat_ratio'] = df['Recommended_Fats'] / total
-    df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']] = df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']].fillna(0)
-    one_hot_cols = [col for col in ['Chronic_Disease', 'Gender'] if col in df.columns]
-    df = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-    features = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio'] + \
-               [col for col in df.columns if col.startswith('Chronic_Disease_') or col.startswith('Gender_')]
-    features = [f for f in features if f in df.columns]
-    return df[features], features
-
-df = pd.read_csv('data/cleaned_nutricare.csv')
-X, features = feature_engineering(df)
-# Only predict macros - calories will be derived from macros
-target_cols = ['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
-y = df[target_cols]
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# 2. Train models
-models = {
-    'XGBoost': MultiOutputRegressor(XGBRegressor(random_state=42, verbosity=0)),
-    'LightGBM': MultiOutputRegressor(LGBMRegressor(random_state=42, verbose=-1)),
-    'CatBoost': MultiOutputRegressor(CatBoostRegressor(verbose=0, random_state=42))
-}
-
-results = []
-best_r2 = -np.inf
-best_model = None
-best_model_name = None
 
 def evaluate(y_true, y_pred):
     mae = mean_absolute_error(y_true, y_pred)
@@ -50,21 +21,60 @@ def evaluate(y_true, y_pred):
     r2 = r2_score(y_true, y_pred)
     return mae, rmse, r2
 
-for name, model in models.items():
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    mae, rmse, r2 = evaluate(y_test, y_pred)
-    results.append({'Model': name, 'MAE': mae, 'RMSE': rmse, 'R2': r2})
-    if r2 > best_r2:
-        best_r2 = r2
-        best_model = model
-        best_model_name = name
 
-# 4. Leaderboard
-leaderboard = pd.DataFrame(results).sort_values('R2', ascending=False)
-os.makedirs('models', exist_ok=True)
-leaderboard.to_csv('models/advanced_model_comparison.csv', index=False)
-joblib.dump(best_model, 'models/best_model_Advanced.joblib')
+def main():
+    parser = argparse.ArgumentParser(description='Train and compare XGBoost, LightGBM and CatBoost.')
+    parser.add_argument('--cpus', type=int, default=None,
+                        help='CPU budget shared by all fits (default: NUTRICARE_CPUS or all available CPUs)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='concurrent fits (default: as many as the budget allows)')
+    args = parser.parse_args()
+
+    # 1. Load the cached features (features.py, shared with serving). Only predict macros -
+    # calories will be derived from macros
+    X, y, features = load_training_data()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # 2. Train models: every model x target fit runs concurrently within the CPU budget
+    models = {
+        'XGBoost': XGBRegressor(random_state=42, verbosity=0),
+        'LightGBM': LGBMRegressor(random_state=42, verbose=-1),
+        'CatBoost': CatBoostRegressor(verbose=0, random_state=42)
+    }
+    run = train(models, X_train, y_train, cpus=args.cpus, workers=args.workers)
+    print(f"Trained {len(run['fits'])} fits in {run['wall_seconds']:.1f}s "
+          f"({run['workers']} workers x {run['threads_per_fit']} threads, CPU budget {run['cpu_budget']})")
+
+    # 3. Evaluate
+    fits = pd.DataFrame(run['fits'])
+    fit_seconds = fits.groupby('Model')['Fit_seconds'].sum()
+    results = []
+    best_r2 = -np.inf
+    best_model = None
+    best_model_name = None
+    for name, model in run['models'].items():
+        y_pred = model.predict(X_test)
+        mae, rmse, r2 = evaluate(y_test, y_pred)
+        results.append({'Model': name, 'MAE': mae, 'RMSE': rmse, 'R2': r2, 'Fit_seconds': fit_seconds[name]})
+        if r2 > best_r2:
+            best_r2 = r2
+            best_model = model
+            best_model_name = name
+
+    # 4. Leaderboard
+    leaderboard = pd.DataFrame(results).sort_values('R2', ascending=False)
+    os.makedirs('models', exist_ok=True)
+    leaderboard.to_csv('models/advanced_model_comparison.csv', index=False)
+    joblib.dump(best_model, 'models/best_model_Advanced.joblib')
+    fits.to_csv('models/advanced_model_fits.csv', index=False)
+    with open('models/advanced_model_run.json', 'w') as f:
+        json.dump({key: run[key] for key in ('wall_seconds', 'cpu_budget', 'workers', 'threads_per_fit')}, f, indent=2)
+
+    print('Leaderboard saved to models/advanced_model_comparison.csv')
+    print('Per-fit timings saved to models/advanced_model_fits.csv, wall time to models/advanced_model_run.json')
+    print(f'Best model: {best_model_name} (R2={best_r2:.3f}) saved to models/best_model_Advanced.joblib')
+
 
-print('Leaderboard saved to models/advanced_model_comparison.csv')
-print(f'Best model: {best_model_name} (R2={best_r2:.3f}) saved to models/best_model_Advanced.joblib')
+if __name__ == '__main__':
+    main()
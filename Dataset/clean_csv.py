@@ -1,44 +1,198 @@
+"""
+Clean the raw Personalized_Diet_Recommendations.csv into data/cleaned_nutricare.csv.
 
+Duplicates are removed, disease names standardized to lowercase with underscores, and
+missing nutrient values filled with the median of their disease group.
+
+By default the whole file is cleaned in memory. With --chunksize the input is streamed in
+two passes, so memory stays flat however large the file is:
+  1. read every chunk, drop rows whose hash was already seen, and accumulate per-disease
+     value counts of each nutrient column (medians come from the counts, not the rows);
+  2. read the chunks again, repeat the same dedup, fill the gaps and append to the output.
+Both modes write identical files.
+
+Usage:
+    python Dataset/clean_csv.py [--input ...] [--output ...] [--chunksize 200000]
+"""
+import argparse
 import pandas as pd
 import numpy as np
 import os
+import sys
 
-# 1. Load the CSV
-df = pd.read_csv('Dataset/Personalized_Diet_Recommendations.csv')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
-# 2. Remove duplicate entries
-df = df.drop_duplicates()
+RAW_PATH = 'Dataset/Personalized_Diet_Recommendations.csv'
+OUTPUT_PATH = 'data/cleaned_nutricare.csv'
 
-# 3. Standardize disease names to lowercase with underscores
-def standardize_disease(val):
-    if pd.isna(val) or val.lower() == 'none':
-        return 'none'
-    return val.strip().lower().replace(' ', '_')
-df['Chronic_Disease'] = df['Chronic_Disease'].apply(standardize_disease)
-
-# 4. Ensure all nutrient columns are numeric
-nutrient_cols = [
+NUTRIENT_COLS = [
     'Caloric_Intake', 'Protein_Intake', 'Carbohydrate_Intake', 'Fat_Intake',
     'Recommended_Calories', 'Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats'
 ]
-for col in nutrient_cols:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-# 5. Fill missing nutritional values with median for that disease group
-disease_groups = ['diabetes', 'hypertension', 'heart_disease']
-for col in nutrient_cols:
-    for disease in disease_groups:
-        mask = (df['Chronic_Disease'] == disease)
-        median_val = df.loc[mask, col].median()
-        df.loc[mask & df[col].isna(), col] = median_val
-
-# 6. Save cleaned dataset as cleaned_nutricare.csv in /data
-os.makedirs('data', exist_ok=True)
-df.to_csv('data/cleaned_nutricare.csv', index=False)
-
-# 7. Print summary
-print(f"Rows: {df.shape[0]}, Columns: {df.shape[1]}")
-print("\nSample rows per disease group:")
-for disease in disease_groups:
-    print(f"\nDisease group: {disease}")
-    print(df[df['Chronic_Disease'] == disease].head(3))
+# Only these groups get their missing nutrients filled
+DISEASE_GROUPS = ['diabetes', 'hypertension', 'heart_disease']
+
+
+def standardize_disease(values):
+    """Disease names lowercase with underscores; missing and 'None' become 'none'."""
+    values = values.astype(object)
+    text = values.str
+    is_none = values.isna() | (text.lower() == 'none')
+    return text.strip().str.lower().str.replace(' ', '_', regex=False).where(~is_none, 'none')
+
+
+def normalize(df):
+    """Standardize the disease column and coerce the nutrient columns to numbers."""
+    df['Chronic_Disease'] = standardize_disease(df['Chronic_Disease'])
+    for col in NUTRIENT_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def fill_missing(df, medians):
+    """Fill missing nutrients from medians (a disease -> column frame) for DISEASE_GROUPS rows."""
+    fill = medians.reindex(DISEASE_GROUPS).reindex(df['Chronic_Disease'])
+    fill.index = df.index
+    if df[NUTRIENT_COLS].isna().any().any():
+        df[NUTRIENT_COLS] = df[NUTRIENT_COLS].fillna(fill)
+    return df
+
+
+def clean(df):
+    """Clean a whole dataframe in memory."""
+    df.drop_duplicates(inplace=True)
+    df = normalize(df)
+    # One groupby over all nutrient columns instead of a mask per column and disease
+    medians = df[df['Chronic_Disease'].isin(DISEASE_GROUPS)].groupby('Chronic_Disease')[NUTRIENT_COLS].median()
+    return fill_missing(df, medians)
+
+
+class RowDeduplicator:
+    """
+    Keeps the first occurrence of each row across chunks by remembering 64-bit row hashes
+    (8 bytes per distinct row) in a sorted array instead of the rows themselves.
+    """
+
+    NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype=np.uint64)
+
+    def _hash_frame(self, chunk):
+        # The same column can parse as int in one chunk, float in another (NaNs) and float
+        # again when it is all-missing, so numbers are hashed as float64 and every missing
+        # value gets one fixed hash whatever the chunk's dtype
+        row_hash = np.zeros(len(chunk), dtype=np.uint64)
+        for col in chunk.columns:
+            values = chunk[col]
+            if pd.api.types.is_numeric_dtype(values):
+                col_hash = pd.util.hash_array(values.to_numpy(dtype=np.float64))
+            else:
+                col_hash = pd.util.hash_array(values.to_numpy(dtype=object))
+            col_hash[values.isna().to_numpy()] = self.NULL_HASH
+            row_hash = row_hash * np.uint64(1000003) ^ col_hash
+        return row_hash
+
+    def filter(self, chunk):
+        hashes = self._hash_frame(chunk)
+        first_in_chunk = ~pd.Series(hashes).duplicated().to_numpy()
+        keep = first_in_chunk
+        if len(self.seen):
+            position = np.minimum(np.searchsorted(self.seen, hashes), len(self.seen) - 1)
+            keep &= self.seen[position] != hashes
+        self.seen = np.union1d(self.seen, hashes[keep])
+        return chunk[keep].copy()
+
+
+def _median_from_counts(counts):
+    """Median of the values described by a value -> count Series (pandas semantics)."""
+    counts = counts.sort_index()
+    cumulative = counts.to_numpy().cumsum()
+    n = cumulative[-1]
+    values = counts.index.to_numpy(dtype=np.float64)
+    lower = values[np.searchsorted(cumulative, (n - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, n // 2, side='right')]
+    return (lower + upper) / 2
+
+
+def collect_medians(path, chunksize):
+    """
+    Pass 1: per-disease medians of every nutrient column over the deduplicated rows, plus
+    the columns that parse as float anywhere in the file.
+    """
+    dedup = RowDeduplicator()
+    counts = {}
+    float_cols = set()
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False):
+        float_cols.update(c for c in chunk.columns if pd.api.types.is_float_dtype(chunk[c]))
+        chunk = normalize(dedup.filter(chunk))
+        float_cols.update(c for c in NUTRIENT_COLS if pd.api.types.is_float_dtype(chunk[c]))
+        grouped = chunk[chunk['Chronic_Disease'].isin(DISEASE_GROUPS)]
+        for col in NUTRIENT_COLS:
+            vc = grouped.groupby(['Chronic_Disease', col]).size()
+            counts[col] = vc if col not in counts else counts[col].add(vc, fill_value=0)
+
+    medians = pd.DataFrame(index=pd.Index(DISEASE_GROUPS, name='Chronic_Disease'), columns=NUTRIENT_COLS, dtype=float)
+    for col, vc in counts.items():
+        for disease, disease_counts in vc.groupby(level=0):
+            medians.loc[disease, col] = _median_from_counts(disease_counts.droplevel(0))
+    return medians, float_cols
+
+
+def clean_streaming(path, output, chunksize):
+    """Two-pass chunked clean of path into output. Returns (rows, columns, sample rows per disease)."""
+    medians, float_cols = collect_medians(path, chunksize)
+
+    dedup = RowDeduplicator()
+    rows, columns = 0, 0
+    samples = {disease: [] for disease in DISEASE_GROUPS}
+    tmp = f'{output}.tmp-{os.getpid()}'
+    try:
+        for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize, low_memory=False)):
+            chunk = fill_missing(normalize(dedup.filter(chunk)), medians)
+            # Match the in-memory dtypes: a column with a float anywhere is float everywhere
+            for col in float_cols:
+                if pd.api.types.is_numeric_dtype(chunk[col]):
+                    chunk[col] = chunk[col].astype(np.float64)
+            chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            rows += len(chunk)
+            columns = chunk.shape[1]
+            for disease in DISEASE_GROUPS:
+                have = sum(len(s) for s in samples[disease])
+                if have < 3:
+                    samples[disease].append(chunk[chunk['Chronic_Disease'] == disease].head(3 - have))
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return rows, columns, {d: pd.concat(parts) for d, parts in samples.items() if parts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean the raw diet recommendations CSV.')
+    parser.add_argument('--input', default=RAW_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the input in chunks of this many rows (two passes, flat memory)')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    if args.chunksize:
+        rows, columns, samples = clean_streaming(args.input, args.output, args.chunksize)
+    else:
+        df = clean(read_dataset(args.input, categorical=False))
+        df.to_csv(args.output, index=False)
+        rows, columns = df.shape
+        samples = {d: df[df['Chronic_Disease'] == d].head(3) for d in DISEASE_GROUPS}
+
+    print(f"Rows: {rows}, Columns: {columns}")
+    print("\nSample rows per disease group:")
+    for disease in DISEASE_GROUPS:
+        print(f"\nDisease group: {disease}")
+        print(samples.get(disease, pd.DataFrame()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
 # Load the cleaned dataset
-df = pd.read_csv('data/cleaned_nutricare.csv')
+df = read_dataset('data/cleaned_nutricare.csv')
 
 summary_lines = []
 
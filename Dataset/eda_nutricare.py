@@ -4,13 +4,17 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
 # Create a directory for plots
 PLOTS_DIR = 'plots'
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
 # Load the cleaned dataset
-df = pd.read_csv('data/cleaned_nutricare.csv')
+df = read_dataset('data/cleaned_nutricare.csv')
 
 # 1. Show dataset shape, column names, and basic info
 print('Shape:', df.shape)
@@ -47,7 +51,7 @@ for col in numeric_cols:
     plt.close()
 
 # 5. Categorical features: value counts and bar plots
-cat_cols = df.select_dtypes(include=['object']).columns
+cat_cols = df.select_dtypes(include=['object', 'category']).columns
 for col in cat_cols:
     print(f'\nValue counts for {col}:')
     print(df[col].value_counts())
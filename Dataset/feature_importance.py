@@ -1,31 +1,19 @@
 import os
+import sys
 import joblib
 import pandas as pd
 import matplotlib.pyplot as plt
 import shap
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import load_training_data
+
 # 1. Load model and data
 model_path = 'models/best_model_RandomForest.joblib'
-data_path = 'data/cleaned_nutricare.csv'
 model = joblib.load(model_path)
-df = pd.read_csv(data_path)
-
-# Feature engineering (must match training)
-def feature_engineering(df):
-    total = df['Recommended_Carbs'] + df['Recommended_Protein'] + df['Recommended_Fats']
-    total = total.replace(0, pd.NA)
-    df['Carb_ratio'] = df['Recommended_Carbs'] / total
-    df['Protein_ratio'] = df['Recommended_Protein'] / total
-    df['Fat_ratio'] = df['Recommended_Fats'] / total
-    df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']] = df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']].fillna(0)
-    one_hot_cols = [col for col in ['Chronic_Disease', 'Gender'] if col in df.columns]
-    df = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-    features = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio'] + \
-               [col for col in df.columns if col.startswith('Chronic_Disease_') or col.startswith('Gender_')]
-    features = [f for f in features if f in df.columns]
-    return df[features], features
-
-X, features = feature_engineering(df)
+
+# Same features the model was trained on (features.py)
+X, _, features = load_training_data()
 os.makedirs('reports/feature_importance', exist_ok=True)
 
 # 2. Feature importances and SHAP for each output
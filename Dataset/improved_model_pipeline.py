@@ -8,6 +8,10 @@ from sklearn.model_selection import train_test_split, RandomizedSearchCV
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import joblib
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
 # Try to import XGBoost and CatBoost
 try:
@@ -27,7 +31,7 @@ def evaluate(y_true, y_pred):
 
 def baseline_predictor(df, targets, group_col='Chronic_Disease'):
     # Group by disease and use median as prediction
-    medians = df.groupby(group_col)[targets].median()
+    medians = df.groupby(group_col, observed=True)[targets].median()
     preds = df[group_col].map(medians.to_dict())
     preds = pd.DataFrame(list(preds))
     return preds
@@ -55,7 +59,7 @@ def feature_engineering(df):
 
 def main():
     os.makedirs('models', exist_ok=True)
-    df = pd.read_csv('data/cleaned_nutricare.csv')
+    df = read_dataset('data/cleaned_nutricare.csv')
     targets = ['Recommended_Calories', 'Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
     # 1. Baseline
     baseline_preds = baseline_predictor(df, targets)
@@ -6,12 +6,16 @@ from sklearn.multioutput import MultiOutputRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
 # Load preprocessed data
-X_train = pd.read_csv('data/X_train.csv')
-X_test = pd.read_csv('data/X_test.csv')
-y_train = pd.read_csv('data/y_train.csv')
-y_test = pd.read_csv('data/y_test.csv')
+X_train = read_dataset('data/X_train.csv')
+X_test = read_dataset('data/X_test.csv')
+y_train = read_dataset('data/y_train.csv')
+y_test = read_dataset('data/y_test.csv')
 
 models = {
     'LinearRegression': LinearRegression(),
@@ -0,0 +1,94 @@
+import pandas as pd
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.multioutput import MultiOutputRegressor
+import joblib
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import load_training_data
+import pickle
+import time
+from xgboost import XGBRegressor
+from catboost import CatBoostRegressor
+from lightgbm import LGBMRegressor
+
+# Native multi-target models fit one ensemble for all three macros instead of one booster per
+# target, so training builds and serving walks a single set of trees.
+
+# 1. Load the cached features (features.py, shared with serving). Only predict macros -
+# calories will be derived from macros
+X, y, features = load_training_data()
+
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+# 2. Wrapped (one booster per target) vs native multi-target models
+models = {
+    'XGBoost': MultiOutputRegressor(XGBRegressor(random_state=42, verbosity=0)),
+    'LightGBM': MultiOutputRegressor(LGBMRegressor(random_state=42, verbose=-1)),
+    'CatBoost': MultiOutputRegressor(CatBoostRegressor(verbose=0, random_state=42)),
+    'XGBoost_MultiOutputTree': XGBRegressor(random_state=42, verbosity=0, tree_method='hist',
+                                            multi_strategy='multi_output_tree'),
+    'CatBoost_MultiRMSE': CatBoostRegressor(verbose=0, random_state=42, loss_function='MultiRMSE'),
+}
+native_models = {'XGBoost_MultiOutputTree', 'CatBoost_MultiRMSE'}
+
+def evaluate(y_true, y_pred):
+    mae = mean_absolute_error(y_true, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    r2 = r2_score(y_true, y_pred)
+    return mae, rmse, r2
+
+def per_row_latency_us(model, X_rows, repeats=200):
+    """Mean latency of single-row predict calls, as the API makes them."""
+    model.predict(X_rows[:1])
+    start = time.perf_counter()
+    for i in range(repeats):
+        model.predict(X_rows[i % len(X_rows)][np.newaxis, :])
+    return (time.perf_counter() - start) / repeats * 1e6
+
+def batch_latency_us(model, X_rows, repeats=5):
+    """Per-row latency when the whole test set is scored in one call."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(X_rows)
+    return (time.perf_counter() - start) / repeats / len(X_rows) * 1e6
+
+X_test_np = X_test.to_numpy(dtype=np.float32)
+
+results = []
+best_r2 = -np.inf
+best_model = None
+best_model_name = None
+
+for name, model in models.items():
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_time = time.perf_counter() - start
+    y_pred = model.predict(X_test)
+    mae, rmse, r2 = evaluate(y_test, y_pred)
+    results.append({
+        'Model': name, 'MAE': mae, 'RMSE': rmse, 'R2': r2,
+        'Native_MultiTarget': name in native_models,
+        'Train_Time_s': train_time,
+        'Model_Size_KB': len(pickle.dumps(model)) / 1024,
+        'Latency_Single_Row_us': per_row_latency_us(model, X_test_np),
+        'Latency_Batch_Per_Row_us': batch_latency_us(model, X_test_np),
+    })
+    print(f"{name}: R2={r2:.3f}, trained in {train_time:.1f}s")
+    if name in native_models and r2 > best_r2:
+        best_r2 = r2
+        best_model = model
+        best_model_name = name
+
+# 3. Leaderboard
+leaderboard = pd.DataFrame(results).sort_values('R2', ascending=False)
+os.makedirs('models', exist_ok=True)
+leaderboard.to_csv('models/multitarget_comparison.csv', index=False)
+joblib.dump(best_model, 'models/best_model_MultiTarget.joblib')
+
+print(leaderboard.to_string(index=False))
+print('Leaderboard saved to models/multitarget_comparison.csv')
+print(f'Best native model: {best_model_name} (R2={best_r2:.3f}) saved to models/best_model_MultiTarget.joblib')
+print('Serve it with NUTRICARE_MODEL_PATH=models/best_model_MultiTarget.joblib')
@@ -3,9 +3,13 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
 
 # 1. Load dataset
-df = pd.read_csv('data/cleaned_nutricare.csv')
+df = read_dataset('data/cleaned_nutricare.csv')
 
 # 2. Drop leakage columns (assuming these are the current intake columns)
 leakage_cols = ['Caloric_Intake', 'Protein_Intake', 'Carbohydrate_Intake', 'Fat_Intake']
@@ -1,3 +1,4 @@
+import argparse
 import os
 import pandas as pd
 import numpy as np
@@ -8,27 +9,20 @@ best_model = None
 best_model_name = None
 os.makedirs('models', exist_ok=True)
 
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, StackingRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
 from xgboost import XGBRegressor
 from catboost import CatBoostRegressor
 import joblib
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import load_training_data
+from stacking import fit_stacks
 
-# 1. Load data and feature engineering (must match training)
-def feature_engineering(df):
-    total = df['Recommended_Carbs'] + df['Recommended_Protein'] + df['Recommended_Fats']
-    total = total.replace(0, pd.NA)
-    df['Carb_ratio'] = df['Recommended_Carbs'] / total
-    df['Protein_ratio'] = df['Recommended_Protein'] / total
-    df['Fat_ratio'] = df['Recommended_Fats'] / total
-    df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']] = df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']].fillna(0)
-    one_hot_cols = [col for col in ['Chronic_Disease', 'Gender'] if col in df.columns]
-    df = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-    features = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio'] + \
-               [col for col in df.columns if col.startswith('Chronic_Disease_') or col.startswith('Gender_')]
-    features = [f for f in features if f in df.columns]
-    return df[features], features
+parser = argparse.ArgumentParser(description='Per-target stacking ensembles over cached out-of-fold predictions.')
+parser.add_argument('--cpus', type=int, default=None, help='CPU budget for the base model fits')
+args = parser.parse_args()
 
 def evaluate(y_true, y_pred):
     mae = mean_absolute_error(y_true, y_pred)
@@ -36,11 +30,10 @@ def evaluate(y_true, y_pred):
     r2 = r2_score(y_true, y_pred)
     return mae, rmse, r2
 
-df = pd.read_csv('data/cleaned_nutricare.csv')
-X, features = feature_engineering(df)
+# 1. Load the cached feature matrix (built by features.py, shared with serving)
 # Only predict macros - calories will be derived from macros
 target_cols = ['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
-y = df[target_cols]
+X, y, features = load_training_data(target_cols)
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
@@ -57,27 +50,20 @@ best_r2 = -np.inf
 best_model = None
 best_model_name = None
 
-# 3. Train stacking ensemble for each target
+# 3. Train a stacking ensemble for each target. Out-of-fold predictions of every base model
+# are computed once per target and cached, and the targets' fits run in parallel
+stacks, fits = fit_stacks(base_models, LinearRegression(), X_train, y_train, cv=5, cpus=args.cpus)
+fits = pd.DataFrame(fits)
+print(f"Base model fits: {int((~fits['Cached']).sum())} trained, {int(fits['Cached'].sum())} from the OOF cache")
+
 ensemble_models = {}
 ensemble_preds = []
 for i, target in enumerate(target_cols):
-    # Fit base models for this target
-    base_models_fitted = []
-    for name, model in base_models:
-        m = model.__class__(**model.get_params())
-        m.fit(X_train, y_train[target])
-        base_models_fitted.append((name, m))
+    stack = stacks[target]
+    for name, m in stack.base_models:
         y_pred = m.predict(X_test)
         mae, rmse, r2 = evaluate(y_test[target], y_pred)
         results.append({'Model': f'{name}_{target}', 'MAE': mae, 'RMSE': rmse, 'R2': r2})
-    # StackingRegressor for this target
-    stack = StackingRegressor(
-        estimators=base_models_fitted,
-        final_estimator=LinearRegression(),
-        passthrough=False,
-        n_jobs=-1
-    )
-    stack.fit(X_train, y_train[target])
     y_pred_stack = stack.predict(X_test)
     ensemble_preds.append(y_pred_stack)
     mae, rmse, r2 = evaluate(y_test[target], y_pred_stack)
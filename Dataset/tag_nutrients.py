@@ -1,26 +1,62 @@
+"""
+Tag every row of the cleaned dataset with a nutrient_tag and save data/tagged_nutricare.csv.
+
+The rules live in nutrient_tags.py and are evaluated over whole columns. With --chunksize
+the input is streamed chunk by chunk, so files larger than memory can be tagged too.
+
+Usage:
+    python Dataset/tag_nutrients.py [--input ...] [--output ...] [--chunksize 500000]
+"""
+import argparse
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_store import read_dataset
+from nutrient_tags import tag_columns
+
+INPUT_PATH = 'data/cleaned_nutricare.csv'
+OUTPUT_PATH = 'data/tagged_nutricare.csv'
+
+
+def tag_file(path, output, chunksize=None):
+    """Write path plus a nutrient_tag column to output; returns tag counts per disease group."""
+    if not chunksize:
+        df = read_dataset(path)
+        df['nutrient_tag'] = tag_columns(df)
+        df.to_csv(output, index=False)
+        return df.groupby(['Chronic_Disease', 'nutrient_tag'], observed=True).size()
+
+    counts = None
+    tmp = f'{output}.tmp-{os.getpid()}'
+    try:
+        for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+            chunk['nutrient_tag'] = tag_columns(chunk)
+            chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            size = chunk.groupby(['Chronic_Disease', 'nutrient_tag']).size()
+            counts = size if counts is None else counts.add(size, fill_value=0).astype(int)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return counts
 
-# 1. Load cleaned_nutricare.csv
-df = pd.read_csv('data/cleaned_nutricare.csv')
 
-def assign_nutrient_tag(row):
-    if row['Recommended_Carbs'] < 100:
-        return 'low_carb'
-    elif row['Recommended_Protein'] > 150:
-        return 'high_protein'
-    elif row['Recommended_Fats'] < 60:
-        return 'low_fat'
-    else:
-        return 'balanced'
+def main():
+    parser = argparse.ArgumentParser(description='Add nutrient tags to the cleaned dataset.')
+    parser.add_argument('--input', default=INPUT_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--chunksize', type=int, default=None, help='stream the input in chunks of this many rows')
+    args = parser.parse_args()
 
-# 2-3. Assign nutrient_tag
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    counts = tag_file(args.input, args.output, args.chunksize)
 
-df['nutrient_tag'] = df.apply(assign_nutrient_tag, axis=1)
+    # Count of each nutrient_tag by disease group
+    print(counts.unstack(fill_value=0))
 
-# 4. Save as tagged_nutricare.csv in /data
-os.makedirs('data', exist_ok=True)
-df.to_csv('data/tagged_nutricare.csv', index=False)
 
-# 5. Print count of each nutrient_tag by disease group
-print(df.groupby(['Chronic_Disease', 'nutrient_tag']).size().unstack(fill_value=0))
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import argparse
+import time
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split, RandomizedSearchCV
@@ -6,48 +8,57 @@ from sklearn.multioutput import MultiOutputRegressor
 from sklearn.metrics import mean_squared_error
 import joblib
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from features import load_training_data
+from model_search import forest_curve_search
 
-# 1. Load data and feature engineering (must match training)
-def feature_engineering(df):
-    total = df['Recommended_Carbs'] + df['Recommended_Protein'] + df['Recommended_Fats']
-    total = total.replace(0, pd.NA)
-    df['Carb_ratio'] = df['Recommended_Carbs'] / total
-    df['Protein_ratio'] = df['Recommended_Protein'] / total
-    df['Fat_ratio'] = df['Recommended_Fats'] / total
-    df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']] = df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']].fillna(0)
-    one_hot_cols = [col for col in ['Chronic_Disease', 'Gender'] if col in df.columns]
-    df = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-    features = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio'] + \
-               [col for col in df.columns if col.startswith('Chronic_Disease_') or col.startswith('Gender_')]
-    features = [f for f in features if f in df.columns]
-    return df[features], features
+parser = argparse.ArgumentParser(description='Tune the RandomForest hyperparameters.')
+parser.add_argument('--mode', choices=['random', 'warm-start'], default='random',
+                    help='random: RandomizedSearchCV over all parameters; warm-start: grow one forest per '
+                         'sampled setting and score every tree count on the way')
+args = parser.parse_args()
 
-df = pd.read_csv('data/cleaned_nutricare.csv')
-X, features = feature_engineering(df)
+# 1. Load the cached feature matrix (built by features.py, shared with serving)
 # Only predict macros - calories will be derived from macros
 target_cols = ['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
-y = df[target_cols]
+X, y, features = load_training_data(target_cols)
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
 # 2. Hyperparameter tuning
-param_dist = {
-    'estimator__n_estimators': [50, 100, 200, 300, 400],
-    'estimator__max_depth': [None, 5, 10, 20, 30],
-    'estimator__min_samples_split': [2, 5, 10],
-    'estimator__min_samples_leaf': [1, 2, 4],
-    'estimator__max_features': ['sqrt', 'log2']
+tree_counts = [50, 100, 200, 300, 400]
+forest_params = {
+    'max_depth': [None, 5, 10, 20, 30],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 'log2']
 }
-rf = MultiOutputRegressor(RandomForestRegressor(random_state=42))
-search = RandomizedSearchCV(rf, param_distributions=param_dist, n_iter=20, cv=5, scoring='neg_mean_squared_error', verbose=2, random_state=42, n_jobs=-1, return_train_score=True)
-search.fit(X_train, y_train)
+start = time.perf_counter()
+if args.mode == 'warm-start':
+    # Same 20 sampled settings as the random mode, but each grows through every tree count,
+    # so the results cover the whole curve for about the cost of the 400-tree forests
+    results = forest_curve_search(RandomForestRegressor(random_state=42), {'n_estimators': tree_counts, **forest_params},
+                                  X_train, y_train, n_iter=20, cv=5)
+    best_params = results.loc[results['rank_test_score'].idxmin(), 'params']
+    best_model = MultiOutputRegressor(RandomForestRegressor(random_state=42)).set_params(**best_params)
+    best_model.fit(X_train, y_train)
+else:
+    param_dist = {'estimator__n_estimators': tree_counts}
+    param_dist.update({f'estimator__{name}': values for name, values in forest_params.items()})
+    rf = MultiOutputRegressor(RandomForestRegressor(random_state=42))
+    search = RandomizedSearchCV(rf, param_distributions=param_dist, n_iter=20, cv=5, scoring='neg_mean_squared_error', verbose=2, random_state=42, n_jobs=-1, return_train_score=True)
+    search.fit(X_train, y_train)
+    results = pd.DataFrame(search.cv_results_)
+    best_params, best_model = search.best_params_, search.best_estimator_
+tuning_seconds = time.perf_counter() - start
 
 # 3. Save results
 os.makedirs('models', exist_ok=True)
-results = pd.DataFrame(search.cv_results_)
 results.to_csv('models/rf_tuning_results.csv', index=False)
-joblib.dump(search.best_estimator_, 'models/best_model_RandomForest_Tuned.joblib')
+joblib.dump(best_model, 'models/best_model_RandomForest_Tuned.joblib')
 
-print('Best params:', search.best_params_)
+print('Best params:', best_params)
+print(f'Best CV MSE: {-results["mean_test_score"].max():.2f}, tuning wall time {tuning_seconds:.1f}s')
 print('Tuning results saved to models/rf_tuning_results.csv')
 print('Best tuned model saved to models/best_model_RandomForest_Tuned.joblib')
@@ -0,0 +1,130 @@
+import asyncio
+import time
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one model call.
+
+    Requests are queued on an asyncio.Queue. A background task takes the first queued
+    row, keeps collecting until max_batch_size rows are waiting or max_wait_ms has passed,
+    scores the stacked matrix on a worker thread and fans the results back out to the
+    waiting futures, so the event loop never blocks on model.predict.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.queue = None
+        self._task = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        # Batch sizes bucketed by powers of two: 1, 2, 3-4, 5-8, ...
+        self.batch_size_buckets = {}
+        self.total_queue_wait = 0.0
+        self.total_predict_time = 0.0
+
+    async def start(self):
+        if self._task is None:
+            self.queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, row, predict_fn=None):
+        """
+        Queue one float32 feature row and wait for its prediction. predict_fn overrides the
+        batcher's default for this row; rows are only batched with rows using the same one,
+        so a row vectorized for one model is never scored by another after a model swap.
+        """
+        if self._task is None:
+            raise RuntimeError("MicroBatcher has not been started")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future, time.perf_counter(), predict_fn or self.predict_fn))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            # Short sleeps instead of wait_for(queue.get()), which can drop an item
+            # when the timeout races with a put
+            await asyncio.sleep(min(remaining, self.max_wait / 4))
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (e.g. client disconnected) are dropped from the batch;
+            # the rest are scored in one call per predict_fn
+            groups = {}
+            for item in batch:
+                if not item[1].done():
+                    groups.setdefault(item[3], []).append(item)
+            for predict_fn, group in groups.items():
+                await self._score(predict_fn, group)
+
+    async def _score(self, predict_fn, batch):
+        started = time.perf_counter()
+        X = np.stack([row for row, _, _, _ in batch])
+        try:
+            predictions = await asyncio.get_running_loop().run_in_executor(self.executor, predict_fn, X)
+        except Exception as e:
+            self.errors += len(batch)
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._record(batch, started)
+        for (_, future, _, _), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self.requests += size
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        bucket = 1 << (size - 1).bit_length()
+        self.batch_size_buckets[bucket] = self.batch_size_buckets.get(bucket, 0) + 1
+        self.total_queue_wait += sum(started - enqueued for _, _, enqueued, _ in batch)
+        self.total_predict_time += time.perf_counter() - started
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "batch_size_histogram": {f"<={k}": v for k, v in sorted(self.batch_size_buckets.items())},
+            "mean_queue_wait_ms": 1000.0 * self.total_queue_wait / self.requests if self.requests else 0.0,
+            "mean_predict_ms": 1000.0 * self.total_predict_time / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,389 @@
+"""
+HTTP load test for predict_api.
+
+Starts `uvicorn predict_api:app` locally (or targets --url), waits for /readyz, then drives it
+with a fixed number of concurrent keep-alive connections for each scenario and concurrency
+level. Records throughput, latency percentiles, server CPU, RSS and PSS (sampled from /proc,
+summed over the server and its worker processes) into a JSON results file and compares it
+against a stored baseline. --workers starts uvicorn with that many worker processes.
+
+Scenarios (payload mixes, see SCENARIOS):
+    single_repeated  /predict with the same profile every time (cache-hot)
+    single_unique    /predict with a never-repeated profile (cache misses, micro-batched)
+    batch            /predict/batch with --batch-size unique profiles
+    mixed            80% repeated-pool singles, 15% unique singles, 5% batches
+A custom mix can be given as --mix single_repeated=0.5,batch=0.5.
+
+Usage (from the repo root):
+    python benchmarks/load_test.py [--concurrency 1,16,64] [--duration 10]
+    python benchmarks/load_test.py --save-baseline          # store this run as the baseline
+    python benchmarks/load_test.py --fail-on-regression     # exit 1 if slower than baseline
+    python benchmarks/load_test.py --workers 1,4,16 --env NUTRICARE_SERVING_MODE=shared
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+GOALS = [(0.35, 0.35, 0.30), (0.40, 0.30, 0.30), (0.45, 0.30, 0.25)]
+DISEASES = ['Chronic_Disease_heart_disease', 'Chronic_Disease_hypertension', 'Chronic_Disease_obesity',
+            'Chronic_Disease_none', None]
+
+SCENARIOS = {
+    'single_repeated': {'single_repeated': 1.0},
+    'single_unique': {'single_unique': 1.0},
+    'batch': {'batch': 1.0},
+    'mixed': {'single_repeated': 0.80, 'single_unique': 0.15, 'batch': 0.05},
+}
+
+
+class Payloads:
+    """Request generators; unique profiles walk BMI in 0.01 steps so none repeats within a run."""
+
+    def __init__(self, batch_size, seed=0):
+        self.batch_size = batch_size
+        self.counter = 0
+        rng = random.Random(seed)
+        self.pool = [self.profile(rng.randint(18, 80), round(rng.uniform(17, 40), 1),
+                                  rng.randrange(3), rng.randrange(5), rng.random() < 0.5) for _ in range(50)]
+
+    @staticmethod
+    def profile(age, bmi, goal, disease, male):
+        carb, protein, fat = GOALS[goal]
+        profile = {'Age': age, 'BMI': bmi, 'Carb_ratio': carb, 'Protein_ratio': protein, 'Fat_ratio': fat,
+                   'Gender_Male': int(male)}
+        if DISEASES[disease]:
+            profile[DISEASES[disease]] = 1
+        return profile
+
+    def unique(self):
+        i = self.counter
+        self.counter += 1
+        return self.profile(18 + (i // 3000) % 80, 15 + (i % 3000) / 100, i % 3, i % 5, i % 2)
+
+    def make(self, kind):
+        """(path, body bytes, rows) for one request of the given kind."""
+        if kind == 'single_repeated':
+            return '/predict', json.dumps(self.pool[0]).encode(), 1
+        if kind == 'single_pool':
+            return '/predict', json.dumps(random.choice(self.pool)).encode(), 1
+        if kind == 'single_unique':
+            return '/predict', json.dumps(self.unique()).encode(), 1
+        if kind == 'batch':
+            return '/predict/batch', json.dumps([self.unique() for _ in range(self.batch_size)]).encode(), self.batch_size
+        raise ValueError(f"Unknown payload kind '{kind}'")
+
+
+def mix_kinds(mix):
+    """The mixed scenario draws its repeated singles from a pool of common profiles."""
+    kinds = list(mix)
+    if len(kinds) > 1:
+        kinds = ['single_pool' if k == 'single_repeated' else k for k in kinds]
+    return kinds, list(mix.values())
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams, so the client costs little CPU."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f'POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode()
+        self.writer.write(head + body)
+        status_and_headers = await self.reader.readuntil(b'\r\n\r\n')
+        lines = status_and_headers.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        length = next(int(l.split(':', 1)[1]) for l in lines[1:] if l.lower().startswith('content-length:'))
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def process_tree(pid):
+    """pid and all its descendants (uvicorn's supervisor and its workers)."""
+    pids, frontier = [pid], [pid]
+    while frontier:
+        children = []
+        for p in frontier:
+            for task in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{task}/children') as f:
+                    children.extend(int(c) for c in f.read().split())
+        pids.extend(children)
+        frontier = children
+    return pids
+
+
+def read_proc(pid):
+    """
+    (cpu seconds used so far, RSS in MB, PSS in MB, processes) of pid and its descendants,
+    from /proc. PSS splits each shared page between the processes mapping it, so unlike
+    RSS it does not count shared libraries and mapped model weights once per worker.
+    """
+    cpu = rss_kb = pss_kb = 0
+    pids = []
+    for p in process_tree(pid):
+        try:
+            with open(f'/proc/{p}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                rollup = {line.split(':')[0]: int(line.split()[1]) for line in f if line.endswith('kB\n')}
+        except FileNotFoundError:
+            # Exited between listing and reading
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss_kb += rollup['Rss']
+        pss_kb += rollup['Pss']
+        pids.append(p)
+    return cpu, rss_kb / 1024, pss_kb / 1024, len(pids)
+
+
+async def run_scenario(host, port, mix, concurrency, duration, warmup, payloads, server_pid):
+    kinds, weights = mix_kinds(mix)
+    latencies, rows_done, errors = [], [0], [0]
+    recording = [False]
+
+    async def worker(seed):
+        rng = random.Random(seed)
+        conn = Connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                path, body, rows = payloads.make(rng.choices(kinds, weights)[0])
+                start = time.perf_counter()
+                try:
+                    status = await conn.request(path, body)
+                except (OSError, asyncio.IncompleteReadError):
+                    conn.close()
+                    conn = Connection(host, port)
+                    status = 599
+                if recording[0]:
+                    latencies.append(time.perf_counter() - start)
+                    if status == 200:
+                        rows_done[0] += rows
+                    else:
+                        errors[0] += 1
+        finally:
+            conn.close()
+
+    deadline = time.perf_counter() + warmup + duration
+    tasks = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+    await asyncio.sleep(warmup)
+    recording[0] = True
+    started = time.perf_counter()
+    client_cpu = time.process_time()
+    samples = [read_proc(server_pid)] if server_pid else []
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0.25)
+        if server_pid:
+            samples.append(read_proc(server_pid))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    result = {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'rows_per_s': rows_done[0] / elapsed,
+        'latency_ms': {
+            'mean': float(np.mean(latencies) * 1000),
+            'p50': float(np.percentile(latencies, 50) * 1000),
+            'p95': float(np.percentile(latencies, 95) * 1000),
+            'p99': float(np.percentile(latencies, 99) * 1000),
+            'max': float(np.max(latencies) * 1000),
+        },
+        'client_cpu_percent': 100 * (time.process_time() - client_cpu) / elapsed,
+    }
+    if server_pid:
+        # 100% = one core fully busy
+        result['server_cpu_percent'] = 100 * (read_proc(server_pid)[0] - samples[0][0]) / elapsed
+        result['server_rss_mb_max'] = max(sample[1] for sample in samples)
+        result['server_pss_mb_max'] = max(sample[2] for sample in samples)
+        result['server_processes'] = samples[-1][3]
+    return result
+
+
+def start_server(port, env, workers=1):
+    cmd = [sys.executable, '-m', 'uvicorn', 'predict_api:app', '--host', '127.0.0.1', '--port', str(port),
+           '--log-level', 'warning']
+    if workers > 1:
+        cmd += ['--workers', str(workers)]
+    return subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env})
+
+
+def wait_ready(host, port, timeout=120, streak=1):
+    async def probe():
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'GET /readyz HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        status = int((await reader.readline()).split()[1])
+        writer.close()
+        return status
+
+    # Each probe is a new connection, which may land on any worker, so with several workers
+    # wait for a streak of ready answers
+    deadline = time.time() + timeout
+    ready = 0
+    while time.time() < deadline:
+        try:
+            ready = ready + 1 if asyncio.run(probe()) == 200 else 0
+        except (OSError, IndexError, ValueError):
+            ready = 0
+        if ready >= streak:
+            return
+        time.sleep(0.2 if ready == 0 else 0.01)
+    raise SystemExit(f"Server on port {port} did not become ready within {timeout}s")
+
+
+def compare(results, baseline, tolerance):
+    """Rows (scenario, concurrency, metric, baseline, current, change) that regressed beyond tolerance."""
+    previous = {(r['scenario'], r['concurrency'], r.get('workers', 1)): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'scenario':<16}{'conc':>5}{'rps':>10}{'vs base':>9}{'p99 ms':>9}{'vs base':>9}")
+    for r in results:
+        base = previous.get((r['scenario'], r['concurrency'], r['workers']))
+        if base is None:
+            continue
+        rps_change = r['rps'] / base['rps'] - 1
+        p99_change = r['latency_ms']['p99'] / base['latency_ms']['p99'] - 1
+        print(f"{r['scenario']:<16}{r['concurrency']:>5}{r['rps']:>10.0f}{rps_change:>+9.0%}"
+              f"{r['latency_ms']['p99']:>9.2f}{p99_change:>+9.0%}")
+        if rps_change < -tolerance:
+            regressions.append((r['scenario'], r['concurrency'], 'rps', base['rps'], r['rps'], rps_change))
+        if p99_change > tolerance:
+            regressions.append((r['scenario'], r['concurrency'], 'p99_ms', base['latency_ms']['p99'],
+                                r['latency_ms']['p99'], p99_change))
+    return regressions
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test predict_api and compare against a baseline.')
+    parser.add_argument('--url', help='target an already running server (http://host:port) instead of starting one')
+    parser.add_argument('--server-pid', type=int, help='pid of the --url server, for CPU/RSS sampling')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for the started server, repeatable')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenario names')
+    parser.add_argument('--mix', help='custom payload mix, e.g. single_unique=0.7,batch=0.3 (runs as "custom")')
+    parser.add_argument('--concurrency', default='1,16,64', help='comma-separated connection counts')
+    parser.add_argument('--workers', default='1', help='comma-separated uvicorn worker counts, one server each')
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds before each run')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', help='results JSON (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative rps drop / p99 increase')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios.split(',') if name}
+    if args.mix:
+        scenarios = {'custom': parse_mix(args.mix)}
+    server_env = dict(item.split('=', 1) for item in args.env)
+
+    results = []
+    for workers in map(int, args.workers.split(',')):
+        server = None
+        if args.url:
+            host, port = args.url.split('//')[-1].rstrip('/').split(':')
+            port, server_pid = int(port), args.server_pid
+        else:
+            host, port = '127.0.0.1', args.port
+            server = start_server(port, server_env, workers)
+            server_pid = server.pid
+        try:
+            wait_ready(host, port, streak=4 * workers)
+            if server_pid:
+                # Footprint once every worker has loaded the model, before any load
+                _, idle_rss, idle_pss, processes = read_proc(server_pid)
+                print(f"workers={workers}: {processes} processes, idle rss {idle_rss:.0f} MB, pss {idle_pss:.0f} MB")
+            for name, mix in scenarios.items():
+                for concurrency in map(int, args.concurrency.split(',')):
+                    payloads = Payloads(args.batch_size)
+                    result = asyncio.run(run_scenario(host, port, mix, concurrency, args.duration, args.warmup,
+                                                      payloads, server_pid))
+                    result = {'scenario': name, 'mix': mix, 'concurrency': concurrency, 'workers': workers, **result}
+                    if server_pid:
+                        result.update(server_idle_rss_mb=idle_rss, server_idle_pss_mb=idle_pss)
+                    results.append(result)
+                    lat = result['latency_ms']
+                    print(f"{name:<16} w={workers:<3} c={concurrency:<4} {result['rps']:8.0f} req/s "
+                          f"{result['rows_per_s']:9.0f} rows/s  "
+                          f"p50 {lat['p50']:6.2f}  p95 {lat['p95']:6.2f}  p99 {lat['p99']:6.2f} ms  "
+                          f"errors {result['errors']}"
+                          + (f"  cpu {result['server_cpu_percent']:4.0f}%  rss {result['server_rss_mb_max']:.0f} MB"
+                             f"  pss {result['server_pss_mb_max']:.0f} MB"
+                             if 'server_cpu_percent' in result else ''))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'server_env': server_env,
+            'duration_s': args.duration,
+            'batch_size': args.batch_size,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scenario, concurrency, metric, before, after, change in regressions:
+            print(f"REGRESSION {scenario} c={concurrency}: {metric} {before:.2f} -> {after:.2f} ({change:+.0%})")
+        if not regressions:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Pure-NumPy evaluator for tree ensembles compiled by tree_compiler.py.
+
+A compiled model is a flat set of arrays in one .npz file: no sklearn, catboost or xgboost
+import is needed to load or score it. Two node-table layouts cover the supported libraries:
+
+- BinaryTrees: arbitrary binary trees (sklearn RandomForest/GradientBoosting, XGBoost) stored
+  as one concatenated node table. Every split is normalized to "x <= threshold goes left".
+- ObliviousTrees: CatBoost symmetric trees, where all nodes on a level share one split, so the
+  leaf index is just the bits (x > border) for each level.
+
+Both evaluate a whole batch of rows across all trees at once with vectorized gathers, trees
+on the leading axis. Thresholds are stored as float32, rounded down at compile time, which
+gives exactly the same decisions as the original float64 comparison for float32 inputs.
+Inputs must not contain NaN (the feature schema always fills missing features with 0).
+
+`save_mapped` writes the same arrays uncompressed into one file (a JSON header, then each
+array at a 64-byte aligned offset), and `load_mapped` maps that file read-only and wraps
+the arrays with np.frombuffer without copying them. Every process that maps the file
+shares one copy of the weights in the page cache, so server workers do not each hold their
+own.
+"""
+import json
+import mmap
+import numpy as np
+
+# Rows evaluated per pass, bounding the (rows x trees) index matrices
+ROW_CHUNK = 2048
+# First bytes of a save_mapped file, followed by the header length as 8 little-endian bytes
+MAPPED_MAGIC = b'NUTRIMAP'
+MAPPED_ALIGN = 64
+
+
+class BinaryTrees:
+    def __init__(self, feature, threshold, left, right, value, roots, scale, bias):
+        self.feature = feature      # (n_nodes,) int32, -1 for leaves
+        self.threshold = threshold  # (n_nodes,) float32
+        self.left = left            # (n_nodes,) int32, leaves point at themselves
+        self.right = right
+        self.value = value          # (n_nodes, n_out) float64, only read at leaves
+        self.roots = roots          # (n_trees,) int32
+        self.scale = scale
+        self.bias = bias            # (n_out,)
+        self.max_depth = self._depth()
+
+    def _depth(self):
+        depth = 0
+        frontier = self.roots
+        while True:
+            internal = frontier[self.feature[frontier] >= 0]
+            if len(internal) == 0:
+                return depth
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+
+    @property
+    def n_outputs(self):
+        return self.value.shape[1]
+
+    def predict(self, X):
+        XT = np.ascontiguousarray(X.T)
+        cols = np.arange(len(X))[np.newaxis, :]
+        node = np.repeat(self.roots[:, np.newaxis], len(X), axis=1)
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            go_left = XT[np.maximum(feature, 0), cols] <= self.threshold[node]
+            node = np.where(feature < 0, node, np.where(go_left, self.left[node], self.right[node]))
+        return self.value[node].sum(axis=0) * self.scale + self.bias
+
+    def arrays(self):
+        return {'feature': self.feature, 'threshold': self.threshold, 'left': self.left,
+                'right': self.right, 'value': self.value, 'roots': self.roots,
+                'scale': np.float64(self.scale), 'bias': self.bias}
+
+
+class ObliviousTrees:
+    def __init__(self, split_feature, split_border, leaf_values, scale, bias):
+        self.split_feature = split_feature  # (n_trees, depth) int32
+        self.split_border = split_border    # (n_trees, depth) float32; +inf pads shallower trees
+        self.leaf_values = leaf_values      # (n_trees, 2**depth, n_out) float64
+        self.scale = scale
+        self.bias = bias
+
+    @property
+    def n_outputs(self):
+        return self.leaf_values.shape[2]
+
+    def predict(self, X):
+        n_trees, depth = self.split_feature.shape
+        XT = np.ascontiguousarray(X.T)
+        # Start each tree's index at its first leaf in the flattened leaf table
+        leaf = np.repeat((np.arange(n_trees) << depth)[:, np.newaxis], len(X), axis=1)
+        for level in range(depth):
+            leaf += (XT[self.split_feature[:, level]] > self.split_border[:, level, np.newaxis]) << level
+        values = self.leaf_values.reshape(-1, self.n_outputs)
+        return values[leaf].sum(axis=0) * self.scale + self.bias
+
+    def arrays(self):
+        return {'split_feature': self.split_feature, 'split_border': self.split_border,
+                'leaf_values': self.leaf_values, 'scale': np.float64(self.scale), 'bias': self.bias}
+
+
+KINDS = {'binary': BinaryTrees, 'oblivious': ObliviousTrees}
+
+
+class CompiledModel:
+    """
+    Sum of compiled ensembles, each writing into some of the output columns
+    (e.g. one ensemble per target for a MultiOutputRegressor). Same predict(X)
+    interface as the original model.
+    """
+
+    def __init__(self, ensembles, feature_names, n_outputs, source=None):
+        self.ensembles = ensembles  # list of (ensemble, output column indices)
+        self.feature_names_ = list(feature_names)
+        self.n_outputs = n_outputs
+        self.source = source
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        out = np.zeros((len(X), self.n_outputs))
+        for start in range(0, len(X), ROW_CHUNK):
+            chunk = X[start:start + ROW_CHUNK]
+            for ensemble, columns in self.ensembles:
+                out[start:start + ROW_CHUNK, columns] += ensemble.predict(chunk)
+        return out
+
+    def save(self, path):
+        meta, arrays = self._layout()
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    def _layout(self):
+        arrays, layout = {}, []
+        for k, (ensemble, columns) in enumerate(self.ensembles):
+            kind = next(name for name, cls in KINDS.items() if isinstance(ensemble, cls))
+            layout.append({'kind': kind, 'columns': list(map(int, columns))})
+            for name, array in ensemble.arrays().items():
+                arrays[f'e{k}_{name}'] = np.ascontiguousarray(array)
+        meta = {'feature_names': self.feature_names_, 'n_outputs': self.n_outputs,
+                'source': self.source, 'ensembles': layout}
+        return meta, arrays
+
+    def save_mapped(self, path, **extra):
+        """Write the arrays uncompressed and aligned for load_mapped; extra goes into the header."""
+        meta, arrays = self._layout()
+        meta.update(extra)
+        offset, index = 0, {}
+        for name, array in arrays.items():
+            index[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset += -(-array.nbytes // MAPPED_ALIGN) * MAPPED_ALIGN
+        meta['arrays'] = index
+        header = json.dumps(meta).encode()
+        start = _data_start(len(header))
+        with open(path, 'wb') as f:
+            f.write(MAPPED_MAGIC + len(header).to_bytes(8, 'little') + header)
+            for name, array in arrays.items():
+                f.seek(start + index[name]['offset'])
+                f.write(array.tobytes())
+
+
+def _data_start(header_length):
+    """Array offsets are relative to the first aligned byte after the header."""
+    return -(-(len(MAPPED_MAGIC) + 8 + header_length) // MAPPED_ALIGN) * MAPPED_ALIGN
+
+
+def _build(meta, arrays):
+    ensembles = []
+    for k, entry in enumerate(meta['ensembles']):
+        prefix = f'e{k}_'
+        parts = {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+        parts['scale'] = float(parts['scale'])
+        ensembles.append((KINDS[entry['kind']](**parts), np.asarray(entry['columns'])))
+    return CompiledModel(ensembles, meta['feature_names'], meta['n_outputs'], meta.get('source'))
+
+
+def _read_header(f, path):
+    if f.read(len(MAPPED_MAGIC)) != MAPPED_MAGIC:
+        raise ValueError(f"{path} is not a mapped compiled model")
+    length = int.from_bytes(f.read(8), 'little')
+    return json.loads(f.read(length)), _data_start(length)
+
+
+def mapped_header(path):
+    """The JSON header of a save_mapped file, without mapping its arrays."""
+    with open(path, 'rb') as f:
+        return _read_header(f, path)[0]
+
+
+def load_mapped(path):
+    """Map a save_mapped file read-only; the model's arrays are views of the shared pages."""
+    with open(path, 'rb') as f:
+        meta, start = _read_header(f, path)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, entry in meta['arrays'].items():
+        count = int(np.prod(entry['shape']))
+        arrays[name] = np.frombuffer(buffer, dtype=entry['dtype'], count=count,
+                                     offset=start + entry['offset']).reshape(entry['shape'])
+    return _build(meta, arrays)
+
+
+def load(path):
+    """Load a compiled .npz model."""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        return _build(meta, {name: data[name] for name in data.files if name != 'meta'})
@@ -0,0 +1,115 @@
+"""
+Incremental CSV parsing for request bodies that arrive in pieces.
+
+`CSVChunker` turns arbitrary byte pieces into blocks of whole CSV rows: it buffers until at
+least chunk_bytes have arrived and cuts at the last row boundary (a newline outside quotes),
+so no row is ever split between blocks. `MultipartFile` pulls the bytes of the uploaded file
+out of a multipart/form-data body as they arrive, using python-multipart's streaming
+parser, so browser form uploads and raw text/csv bodies feed the chunker the same way.
+Memory is bounded by chunk_bytes plus one network read, whatever the upload size.
+"""
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+class CSVChunker:
+    def __init__(self, chunk_bytes=1 << 20):
+        self.chunk_bytes = chunk_bytes
+        self.header = None
+        self._buffer = bytearray()
+
+    def _cut(self, limit):
+        """Offset just past the last row boundary before limit (a newline outside quotes), or 0."""
+        cut = self._buffer.rfind(b'\n', 0, limit)
+        # An odd number of quotes before a newline means it sits inside a quoted field
+        while cut >= 0 and self._buffer.count(b'"', 0, cut) % 2:
+            cut = self._buffer.rfind(b'\n', 0, cut)
+        return cut + 1
+
+    def _next_cut(self, start):
+        """Offset just past the first row boundary at or after start, or 0."""
+        cut = self._buffer.find(b'\n', start)
+        while cut >= 0 and self._buffer.count(b'"', 0, cut) % 2:
+            cut = self._buffer.find(b'\n', cut + 1)
+        return cut + 1
+
+    def feed(self, data):
+        """Blocks of whole rows (without the header), each about chunk_bytes, completed by data."""
+        self._buffer += data
+        if self.header is None:
+            end = self._buffer.find(b'\n')
+            if end < 0:
+                return []
+            self.header = bytes(self._buffer[:end + 1])
+            del self._buffer[:end + 1]
+        blocks = []
+        while len(self._buffer) >= self.chunk_bytes:
+            # A single row longer than chunk_bytes makes a block of its own
+            cut = self._cut(self.chunk_bytes) or self._next_cut(self.chunk_bytes)
+            if cut == 0:
+                break
+            blocks.append(bytes(self._buffer[:cut]))
+            del self._buffer[:cut]
+        return blocks
+
+    def close(self):
+        """Whatever is left once the body has ended (a last row may lack its newline)."""
+        if self.header is None and self._buffer:
+            self.header, self._buffer = bytes(self._buffer) + b'\n', bytearray()
+        block = bytes(self._buffer)
+        self._buffer = bytearray()
+        return [block] if block.strip() else []
+
+
+class MultipartFile:
+    """Streams the first file part (a part with a filename) of a multipart/form-data body."""
+
+    def __init__(self, content_type):
+        _, options = parse_options_header(content_type)
+        if b'boundary' not in options:
+            raise ValueError("multipart body without a boundary")
+        self._data = []
+        self._headers = {}
+        self._field = b''
+        self._in_file = False
+        self._done = False
+        self._parser = MultipartParser(options[b'boundary'], {
+            'on_part_begin': self._part_begin,
+            'on_header_field': self._header_field,
+            'on_header_value': self._header_value,
+            'on_header_end': self._header_end,
+            'on_headers_finished': self._headers_finished,
+            'on_part_data': self._part_data,
+            'on_part_end': self._part_end,
+        })
+
+    def _part_begin(self):
+        self._headers, self._field = {}, b''
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        name = self._field.lower()
+        self._headers[name] = self._headers.get(name, b'') + data[start:end]
+
+    def _header_end(self):
+        self._field = b''
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b'content-disposition', b''))
+        self._in_file = not self._done and b'filename' in options
+
+    def _part_data(self, data, start, end):
+        if self._in_file:
+            self._data.append(data[start:end])
+
+    def _part_end(self):
+        if self._in_file:
+            self._done = True
+        self._in_file = False
+
+    def feed(self, data):
+        """The file bytes contained in this piece of the body."""
+        self._parser.write(data)
+        pieces, self._data = self._data, []
+        return b''.join(pieces)
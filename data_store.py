@@ -0,0 +1,233 @@
+"""
+Typed columnar cache for the project's CSV datasets.
+
+The first read of a CSV converts it, in chunks of CHUNK_ROWS rows, into one .npy file per
+column under data/column_cache/<name>-<path hash>/. Numeric and boolean columns keep their
+dtype. Text columns (Gender, Chronic_Disease, Dietary_Habits, Preferred_Cuisine, ...) are
+dictionary-encoded: the smallest integer dtype that fits holds the codes (-1 for missing),
+next to a sorted array of the distinct values, and they load back as pandas categoricals.
+
+manifest.json records the source's size, mtime and sha256. A read with an unchanged size and
+mtime trusts the cache without touching the CSV; otherwise the file is re-hashed, and only a
+changed hash triggers a rebuild. Reads can select a subset of columns, and only those .npy
+files are loaded.
+
+Usage:
+    python data_store.py data/cleaned_nutricare.csv [--refresh]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT, 'data', 'column_cache')
+CHUNK_ROWS = 500_000
+FORMAT_VERSION = 1
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def entry_dir(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f'{stem}-{path_hash}')
+
+
+class _TextColumn:
+    """Incremental dictionary encoder: codes in first-seen order, sorted when finished."""
+
+    def __init__(self):
+        self.lookup = {}
+        self.codes = []
+
+    def add(self, values):
+        import pandas as pd
+        local_codes, uniques = pd.factorize(values)
+        to_global = np.empty(len(uniques) + 1, dtype=np.int64)
+        for j, value in enumerate(uniques):
+            to_global[j] = self.lookup.setdefault(str(value), len(self.lookup))
+        to_global[-1] = -1  # factorize marks missing values with -1
+        self.codes.append(to_global[local_codes])
+
+    def finish(self):
+        categories = np.array(sorted(self.lookup), dtype=str)
+        remap = np.empty(len(categories) + 1, dtype=np.int64)
+        remap[[self.lookup[c] for c in categories]] = np.arange(len(categories))
+        remap[-1] = -1  # code -1 (missing) indexes the last slot
+        codes = remap[np.concatenate(self.codes)]
+        dtype = next(t for t in (np.int8, np.int16, np.int32, np.int64) if len(categories) < np.iinfo(t).max)
+        return codes.astype(dtype), categories
+
+
+def _convert(path, target, stat, sha256):
+    import pandas as pd
+    from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+    names, numeric, text = None, {}, {}
+    rows = 0
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, low_memory=False):
+        names = names or list(chunk.columns)
+        rows += len(chunk)
+        for name in names:
+            col = chunk[name]
+            if name not in text and (is_numeric_dtype(col) or is_bool_dtype(col)):
+                numeric.setdefault(name, []).append(col.to_numpy())
+                continue
+            if name not in text:
+                # Text after all (e.g. all-missing in earlier chunks): re-encode what was seen
+                text[name] = _TextColumn()
+                for part in numeric.pop(name, []):
+                    text[name].add(part.astype(object))
+            text[name].add(col.to_numpy(dtype=object))
+
+    columns = []
+    for i, name in enumerate(names):
+        if name in text:
+            codes, categories = text[name].finish()
+            np.save(os.path.join(target, f'c{i}.npy'), codes)
+            np.save(os.path.join(target, f'c{i}.categories.npy'), categories)
+            columns.append({'name': name, 'kind': 'category', 'dtype': str(codes.dtype),
+                            'categories': len(categories)})
+        else:
+            values = np.concatenate(numeric[name])
+            np.save(os.path.join(target, f'c{i}.npy'), values)
+            columns.append({'name': name, 'kind': 'numeric', 'dtype': str(values.dtype)})
+    return {
+        'format_version': FORMAT_VERSION,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+        'rows': rows,
+        'columns': columns,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def _write_manifest(entry, manifest):
+    tmp = os.path.join(entry, f'manifest.json.tmp-{os.getpid()}')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(entry, 'manifest.json'))
+
+
+def _read_manifest(entry):
+    try:
+        with open(os.path.join(entry, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+
+def ensure(path, cache_dir=CACHE_DIR, refresh=False):
+    """Return the manifest of an up-to-date cache entry for path, (re)building it if needed."""
+    entry = entry_dir(path, cache_dir)
+    stat = os.stat(path)
+    manifest = None if refresh else _read_manifest(entry)
+    if manifest is not None:
+        if (manifest['size'], manifest['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return manifest
+        sha256 = file_sha256(path)
+        if sha256 == manifest['sha256']:
+            # Touched but unchanged: remember the new mtime so the next read skips hashing
+            manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            _write_manifest(entry, manifest)
+            return manifest
+    else:
+        sha256 = file_sha256(path)
+
+    # Built in a staging directory and swapped in, so readers never see a partial entry
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = f'{entry}.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        manifest = _convert(path, staging, stat, sha256)
+        _write_manifest(staging, manifest)
+        if os.path.isdir(entry):
+            retired = f'{entry}.old-{os.getpid()}'
+            os.rename(entry, retired)
+            shutil.rmtree(retired, ignore_errors=True)
+        os.rename(staging, entry)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def source_sha256(path, cache_dir=CACHE_DIR):
+    """sha256 of path, answered from the cache manifest when the file is unchanged."""
+    return ensure(path, cache_dir)['sha256']
+
+
+def read_columns(path, columns=None, cache_dir=CACHE_DIR, mmap_mode=None):
+    """
+    Selected columns as {name: ndarray} without building a DataFrame. Text columns come
+    back as (codes, categories) pairs. mmap_mode='r' memory-maps the column files instead
+    of reading them, so slices can be processed without loading whole columns.
+    """
+    manifest = ensure(path, cache_dir)
+    entry = entry_dir(path, cache_dir)
+    index = {c['name']: (i, c) for i, c in enumerate(manifest['columns'])}
+    names = list(columns) if columns is not None else list(index)
+    unknown = [name for name in names if name not in index]
+    if unknown:
+        raise ValueError(f"Columns not in {path}: {unknown}")
+    data = {}
+    for name in names:
+        i, column = index[name]
+        values = np.load(os.path.join(entry, f'c{i}.npy'), mmap_mode=mmap_mode)
+        if column['kind'] == 'category':
+            values = (values, np.load(os.path.join(entry, f'c{i}.categories.npy')))
+        data[name] = values
+    return data
+
+
+def read_dataset(path, columns=None, categorical=True, cache_dir=CACHE_DIR):
+    """
+    Drop-in replacement for pd.read_csv(path)[columns]. Text columns are pandas categoricals,
+    or plain object columns with categorical=False.
+    """
+    import pandas as pd
+    data = {}
+    for name, values in read_columns(path, columns, cache_dir).items():
+        if isinstance(values, tuple):
+            codes, categories = values
+            values = pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+            if not categorical:
+                values = np.asarray(values, dtype=object)
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a CSV into the columnar cache and report timings.')
+    parser.add_argument('csv')
+    parser.add_argument('--refresh', action='store_true', help='rebuild even if the cache is current')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = ensure(args.csv, refresh=args.refresh)
+    built = time.perf_counter()
+    read_dataset(args.csv)
+    loaded = time.perf_counter()
+    print(f"{manifest['rows']} rows x {len(manifest['columns'])} columns cached in {entry_dir(args.csv)}")
+    print(f"ensure: {(built - start) * 1000:.1f} ms, full read: {(loaded - built) * 1000:.1f} ms")
+    for column in manifest['columns']:
+        detail = f"{column['categories']} categories" if column['kind'] == 'category' else ''
+        print(f"  {column['name']:<28} {column['kind']:<9} {column['dtype']:<8} {detail}")
+
+
+if __name__ == '__main__':
+    main()
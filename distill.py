@@ -0,0 +1,178 @@
+"""
+Distils the served CatBoost ensemble into a small, fast student model.
+
+`synthetic_sample` draws a dense sample of the serving input space: integer ages, BMI, the
+goal ratio presets (mixed with ratio triplets seen in training, which is what the dataset
+and custom clients send), and every gender / disease one-hot state. The teacher
+(models/best_model_Advanced.joblib, three 1000-tree CatBoost models) labels it, and a single
+shallow CatBoost MultiRMSE model predicting all three macros is fitted to those labels. The
+student is compiled with tree_compiler.py into a NumPy-only .npz, so serving it needs no ML
+library, and a fidelity report compares it with the teacher (held-out synthetic rows) and
+with the ground truth (the training script's test split), alongside single-row latency.
+
+Start the API with NUTRICARE_SERVING_MODE=student to serve it.
+
+Usage:
+    python distill.py [--teacher models/best_model_Advanced.joblib] [--rows 200000] [--trees 400] [--depth 6]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from features import MACRO_TARGETS
+from lookup_table import GOAL_PRESETS, RATIO_COLUMNS, one_hot_groups
+
+STUDENT_PATH = 'models/student_model.npz'
+REPORT_PATH = 'models/student_model.json'
+
+
+def synthetic_sample(columns, n_rows, ratio_pool=None, preset_fraction=0.5, age_min=18, age_max=100,
+                     bmi_min=10.0, bmi_max=60.0, seed=0):
+    """
+    float32 feature rows covering the serving input space. A preset_fraction of the rows
+    use the goal presets; the rest take (Carb, Protein, Fat) ratios from ratio_pool rows.
+    """
+    rng = np.random.default_rng(seed)
+    index = {c: i for i, c in enumerate(columns)}
+    X = np.zeros((n_rows, len(columns)), dtype=np.float32)
+    X[:, index['Age']] = rng.integers(age_min, age_max + 1, n_rows)
+    X[:, index['BMI']] = rng.uniform(bmi_min, bmi_max, n_rows)
+
+    ratios = np.asarray(GOAL_PRESETS, dtype=np.float32)[rng.integers(len(GOAL_PRESETS), size=n_rows)]
+    if ratio_pool is not None and preset_fraction < 1:
+        pool = np.asarray(ratio_pool, dtype=np.float32)
+        custom = rng.random(n_rows) >= preset_fraction
+        ratios[custom] = pool[rng.integers(len(pool), size=int(custom.sum()))]
+    for j, col in enumerate(RATIO_COLUMNS):
+        X[:, index[col]] = ratios[:, j]
+
+    # Each one-hot group is in its baseline state (all zero) or has exactly one column set
+    for cols in one_hot_groups(columns):
+        state = rng.integers(len(cols) + 1, size=n_rows)
+        for k, col in enumerate(cols):
+            X[:, index[col]] = state == k + 1
+    return X
+
+
+def student_estimator(n_estimators=400, depth=6, learning_rate=0.3, threads=-1, random_state=42):
+    """One oblivious-tree ensemble for all targets: a single pass per row when compiled."""
+    from catboost import CatBoostRegressor
+
+    return CatBoostRegressor(loss_function='MultiRMSE', iterations=n_estimators, depth=depth,
+                             learning_rate=learning_rate, thread_count=threads, random_seed=random_state,
+                             verbose=0, allow_writing_files=False)
+
+
+def _scores(y_true, y_pred):
+    from sklearn.metrics import mean_absolute_error, r2_score
+
+    y_true, y_pred = np.asarray(y_true, dtype=np.float64), np.asarray(y_pred, dtype=np.float64)
+    per_target = {}
+    for j, target in enumerate(MACRO_TARGETS):
+        per_target[target] = {'mae': float(mean_absolute_error(y_true[:, j], y_pred[:, j])),
+                              'max_abs': float(np.abs(y_true[:, j] - y_pred[:, j]).max()),
+                              'r2': float(r2_score(y_true[:, j], y_pred[:, j]))}
+    return {'r2': float(r2_score(y_true, y_pred)), 'mae': float(mean_absolute_error(y_true, y_pred)),
+            'targets': per_target}
+
+
+def single_row_latency(model, X, repeats=2000):
+    """Median seconds for one predict() call on one row, cycling through rows of X."""
+    rows = [X[i:i + 1] for i in range(min(len(X), 100))]
+    timings = np.empty(repeats)
+    for k in range(repeats):
+        row = rows[k % len(rows)]
+        start = time.perf_counter()
+        model.predict(row)
+        timings[k] = time.perf_counter() - start
+    return float(np.median(timings))
+
+
+def fidelity_report(teacher, student, X_holdout, y_holdout, X_test, y_test):
+    """Student vs teacher on held-out synthetic rows, and both vs ground truth on the test split."""
+    X_test = np.asarray(X_test, dtype=np.float32)
+    return {
+        'teacher_agreement': _scores(y_holdout, student.predict(X_holdout)),
+        'ground_truth': {'teacher': _scores(y_test, teacher.predict(X_test)),
+                         'student': _scores(y_test, student.predict(X_test))},
+        'single_row_seconds': {'teacher': single_row_latency(teacher, X_holdout),
+                               'student': single_row_latency(student, X_holdout)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distil the served model into a compiled student model.')
+    parser.add_argument('--teacher', default='models/best_model_Advanced.joblib')
+    parser.add_argument('-o', '--output', default=STUDENT_PATH)
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--rows', type=int, default=200000, help='synthetic training rows')
+    parser.add_argument('--holdout-rows', type=int, default=50000, help='synthetic rows kept back for the report')
+    parser.add_argument('--preset-fraction', type=float, default=0.5,
+                        help='share of rows using the goal presets rather than training ratio triplets')
+    parser.add_argument('--trees', type=int, default=400)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--learning-rate', type=float, default=0.3)
+    parser.add_argument('--cpus', type=int, default=None,
+                        help='threads for the student fit (default: NUTRICARE_CPUS or all available CPUs)')
+    args = parser.parse_args()
+
+    import joblib
+    from sklearn.model_selection import train_test_split
+    from features import load_training_data
+    from feature_schema import model_feature_names
+    from parallel_training import cpu_budget
+    from tree_compiler import check_parity, compile_model
+
+    teacher = joblib.load(args.teacher)
+    columns = model_feature_names(teacher)
+    # The split advanced_models.py trained the teacher on: ratios come from its training
+    # rows, and its test rows are the ground truth for the report
+    X, y, _ = load_training_data()
+    X_train, X_test, _, y_test = train_test_split(X[columns], y, test_size=0.2, random_state=42)
+
+    start = time.perf_counter()
+    X_synth = synthetic_sample(columns, args.rows + args.holdout_rows, X_train[list(RATIO_COLUMNS)],
+                               args.preset_fraction)
+    y_synth = np.asarray(teacher.predict(X_synth), dtype=np.float64)
+    X_fit, X_holdout = X_synth[:args.rows], X_synth[args.rows:]
+    y_fit, y_holdout = y_synth[:args.rows], y_synth[args.rows:]
+    print(f"Labelled {len(X_synth)} synthetic rows with the teacher in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    model = student_estimator(args.trees, args.depth, args.learning_rate, cpu_budget(args.cpus))
+    model.fit(X_fit, y_fit)
+    print(f"Fitted the student in {time.perf_counter() - start:.1f}s")
+    try:
+        compiled = compile_model(model)
+    except (TypeError, ValueError) as e:
+        raise SystemExit(f"Cannot compile the student: {e}")
+    # Fit on a bare array, so give the artifact the teacher's column names
+    compiled.feature_names_ = list(columns)
+    max_diff = check_parity(model, compiled, X_holdout)
+    if max_diff > 1e-3:
+        raise SystemExit(f"Compiled student deviates from the fitted one by {max_diff:.2e}; not saved")
+
+    report = fidelity_report(teacher, compiled, X_holdout, y_holdout, X_test, y_test)
+    with open(args.teacher, 'rb') as f:
+        report['teacher_version'] = hashlib.sha256(f.read()).hexdigest()[:12]
+    report.update(teacher_path=args.teacher, rows=args.rows, holdout_rows=args.holdout_rows,
+                  preset_fraction=args.preset_fraction, trees=args.trees, depth=args.depth,
+                  learning_rate=args.learning_rate)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    compiled.save(args.output)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    agreement, truth = report['teacher_agreement'], report['ground_truth']
+    latency = report['single_row_seconds']
+    print(f"Student vs teacher (synthetic holdout): R2={agreement['r2']:.4f}, MAE={agreement['mae']:.2f} g")
+    print(f"Test split R2: teacher {truth['teacher']['r2']:.4f}, student {truth['student']['r2']:.4f}")
+    print(f"Single-row predict: teacher {latency['teacher'] * 1e6:.0f} us, student {latency['student'] * 1e6:.0f} us")
+    print(f"Student saved to {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB), report to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import joblib
+from features import load_training_data
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import (
     mean_absolute_error, 
@@ -10,26 +11,8 @@ from sklearn.metrics import (
     explained_variance_score
 )
 
-# Load and prepare data (same as training)
-df = pd.read_csv('data/cleaned_nutricare.csv')
-
-# Feature engineering
-total = df['Recommended_Carbs'] + df['Recommended_Protein'] + df['Recommended_Fats']
-total = total.replace(0, pd.NA)
-df['Carb_ratio'] = df['Recommended_Carbs'] / total
-df['Protein_ratio'] = df['Recommended_Protein'] / total
-df['Fat_ratio'] = df['Recommended_Fats'] / total
-df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']] = df[['Carb_ratio', 'Protein_ratio', 'Fat_ratio']].fillna(0)
-
-# One-hot encoding
-one_hot_cols = [col for col in ['Chronic_Disease', 'Gender'] if col in df.columns]
-df = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-
-# Features
-features = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio'] + \
-           [col for col in df.columns if col.startswith('Chronic_Disease_') or col.startswith('Gender_')]
-X = df[features]
-y = df[['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']]
+# Load the cached feature matrix (same as training, see features.py)
+X, y, features = load_training_data()
 
 # Train-test split
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -0,0 +1,124 @@
+import hashlib
+import numbers
+import numpy as np
+
+# One-hot levels that pd.get_dummies(..., drop_first=True) folded into the all-zero
+# baseline during training. Clients (e.g. the React form) still send them, so they are
+# accepted and simply contribute nothing to the feature vector.
+BASELINE_DUMMIES = frozenset({'Gender_Female', 'Chronic_Disease_diabetes'})
+
+# Larger magnitudes (and NaN, which fails every comparison) are not finite as float32
+FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+
+def model_feature_names(model):
+    """Return the column order a fitted model was trained on."""
+    if hasattr(model, 'feature_names_'):
+        return list(model.feature_names_)
+    if hasattr(model, 'estimators_') and len(model.estimators_) > 0:
+        first = model.estimators_[0]
+        if hasattr(first, 'feature_names_'):
+            return list(first.feature_names_)
+        if hasattr(first, 'feature_names_in_'):
+            return list(first.feature_names_in_)
+    if hasattr(model, 'feature_names_in_'):
+        return list(model.feature_names_in_)
+    raise ValueError(f"Cannot determine feature names for {type(model).__name__}")
+
+
+class FeatureSchema:
+    """
+    Maps input keys straight to column indices of the model's feature matrix.
+    Built once when the model loads; fills preallocated float32 rows without pandas.
+    Missing features default to 0; unknown keys, non-numeric values (booleans included) and
+    values that are not finite as float32 (NaN, Infinity, 1e40) are rejected.
+    """
+
+    def __init__(self, columns, baseline_keys=BASELINE_DUMMIES):
+        self.columns = tuple(columns)
+        self.index = {col: i for i, col in enumerate(self.columns)}
+        self.baseline_keys = frozenset(baseline_keys) - set(self.index)
+        # Identifies the binary row layout (column order and dtype) clients must send
+        self.digest = hashlib.sha256(('float32:' + ','.join(self.columns)).encode()).hexdigest()[:16]
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(model_feature_names(model))
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    def fill(self, row, input_dict):
+        """Write input_dict into the zeroed 1-D array row. Raises ValueError on bad input."""
+        if not isinstance(input_dict, dict):
+            raise ValueError("profile must be a JSON object")
+        index = self.index
+        for key, value in input_dict.items():
+            i = index.get(key)
+            if i is None:
+                if key in self.baseline_keys:
+                    continue
+                raise ValueError(f"unknown feature '{key}'")
+            # bool is a numbers.Real too, but true/false is not a feature value
+            if isinstance(value, bool) or not isinstance(value, numbers.Real):
+                raise ValueError(f"feature '{key}' must be a number")
+            if not abs(value) <= FLOAT32_MAX:
+                raise ValueError(f"feature '{key}' must be a finite number")
+            row[i] = value
+        return row
+
+    def vectorize(self, input_dict):
+        """Return a float32 row of shape (n_features,) for a single input dict."""
+        return self.fill(np.zeros(self.n_features, dtype=np.float32), input_dict)
+
+    def vectorize_many(self, rows):
+        """Return a float32 matrix of shape (len(rows), n_features)."""
+        X = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for i, input_dict in enumerate(rows):
+            self.fill(X[i], input_dict)
+        return X
+
+    def vectorize_columns(self, columns):
+        """
+        Float32 matrix from {name: 1-D array} of equal-length columns, the column-wise form
+        of vectorize_many. Numeric columns named after features are copied. Text columns,
+        given as (codes, categories) pairs like data_store.read_columns returns them (code
+        -1 = missing), set the one-hot feature of their level: Gender 'Male' sets
+        Gender_Male, and baseline levels set nothing. Raises ValueError on unknown features
+        or levels and on missing values, which would otherwise read as the baseline level.
+        """
+        first = next(iter(columns.values()), ((),))
+        X = np.zeros((len(first[0] if isinstance(first, tuple) else first), self.n_features), dtype=np.float32)
+        for name, values in columns.items():
+            if isinstance(values, tuple):
+                codes, categories = values
+                missing = int((np.asarray(codes) < 0).sum())
+                if missing:
+                    raise ValueError(f"feature '{name}' has {missing} missing values")
+                # Feature column per level, -1 for baseline levels
+                target = np.full(len(categories), -1, dtype=np.int64)
+                for k, level in enumerate(categories):
+                    key = f'{name}_{level}'
+                    if key in self.index:
+                        target[k] = self.index[key]
+                    elif key not in self.baseline_keys:
+                        raise ValueError(f"unknown feature '{key}'")
+                feature = target[codes]
+                rows = np.flatnonzero(feature >= 0)
+                X[rows, feature[rows]] = 1
+                continue
+            i = self.index.get(name)
+            if i is None:
+                raise ValueError(f"unknown feature '{name}'")
+            values = np.asarray(values)
+            if values.dtype.kind not in 'biuf':
+                raise ValueError(f"feature '{name}' must be numeric")
+            missing = int(np.isnan(values).sum()) if values.dtype.kind == 'f' else 0
+            if missing:
+                raise ValueError(f"feature '{name}' has {missing} missing values")
+            infinite = int((np.abs(values) > FLOAT32_MAX).sum()) if values.dtype.kind == 'f' else 0
+            if infinite:
+                raise ValueError(f"feature '{name}' has {infinite} values that are not finite as float32")
+            X[:, i] = values
+        return X
@@ -0,0 +1,177 @@
+"""
+Shared feature engineering for the training and evaluation scripts.
+
+`build_features` turns the cleaned dataset into the model's float32 feature matrix: the
+macro ratio features plus drop-first one-hot columns for Chronic_Disease and Gender, in the
+same order pd.get_dummies(drop_first=True) produced in the original scripts. `load` caches
+that matrix and the targets as .npy files under data/feature_cache/<key>/, where the key
+combines the source file's sha256 with a hash of this module, so editing either the data or
+the feature code rebuilds the cache on the next load.
+
+Usage:
+    python features.py [--data data/cleaned_nutricare.csv] [--refresh]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(ROOT, 'data', 'cleaned_nutricare.csv')
+CACHE_DIR = os.path.join(ROOT, 'data', 'feature_cache')
+
+BASE_FEATURES = ['Age', 'BMI', 'Carb_ratio', 'Protein_ratio', 'Fat_ratio']
+CATEGORICAL = ['Chronic_Disease', 'Gender']
+RATIO_SOURCES = {'Carb_ratio': 'Recommended_Carbs', 'Protein_ratio': 'Recommended_Protein',
+                 'Fat_ratio': 'Recommended_Fats'}
+# Only macros are predicted - calories are derived from them
+MACRO_TARGETS = ['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
+ALL_TARGETS = ['Recommended_Calories'] + MACRO_TARGETS
+
+
+def _sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Any change to this file (and so to build_features) gives the cache a new key
+CODE_VERSION = _sha256(os.path.abspath(__file__))[:8]
+
+
+def macro_ratios(data):
+    """{ratio feature: array} from the Recommended_* gram columns of a dataframe or column dict."""
+    sources = {ratio: np.asarray(data[source], dtype=np.float64) for ratio, source in RATIO_SOURCES.items()}
+    total = sum(sources.values())
+    # Rows whose macros sum to 0 or are missing get ratio 0 instead of NaN, like the old
+    # feature_engineering's fillna(0)
+    valid = (total != 0) & np.isfinite(total)
+    return {ratio: np.divide(values, total, out=np.zeros(len(total)), where=valid)
+            for ratio, values in sources.items()}
+
+
+def build_features(df):
+    """
+    Feature matrix for a cleaned dataframe.
+    Returns:
+        (X float32 array, feature column names, baseline levels dropped by the one-hot encoding)
+    """
+    columns = {'Age': df['Age'].to_numpy(), 'BMI': df['BMI'].to_numpy()}
+    columns.update(macro_ratios(df))
+
+    baseline = {}
+    for col in CATEGORICAL:
+        if col not in df.columns:
+            continue
+        values = df[col].to_numpy(dtype=object)
+        levels = sorted(v for v in set(values) if isinstance(v, str))
+        baseline[col] = levels[0]
+        for level in levels[1:]:
+            columns[f'{col}_{level}'] = values == level
+
+    names = [c for c in BASE_FEATURES if c in columns] + [c for c in columns if c not in BASE_FEATURES]
+    X = np.empty((len(df), len(names)), dtype=np.float32)
+    for j, name in enumerate(names):
+        X[:, j] = columns[name]
+    return X, names, baseline
+
+
+class FeatureSet:
+    """Cached features and targets, with DataFrame views for sklearn/CatBoost feature names."""
+
+    def __init__(self, X, y, metadata):
+        self.X = X
+        self.y = y
+        self.metadata = metadata
+        self.features = metadata['features']
+        self.targets = metadata['targets']
+
+    def frames(self, targets=MACRO_TARGETS):
+        """(X, y) as DataFrames over the cached arrays; fitting on these records the feature names."""
+        import pandas as pd
+        X = pd.DataFrame(self.X, columns=self.features, copy=False)
+        y = pd.DataFrame(self.y[:, [self.targets.index(t) for t in targets]], columns=list(targets))
+        return X, y
+
+    def schema(self):
+        """The serving FeatureSchema for exactly these columns."""
+        from feature_schema import FeatureSchema
+        return FeatureSchema(self.features)
+
+
+def _build_entry(path, entry, source_hash):
+    import data_store
+    available = {c['name'] for c in data_store.ensure(path)['columns']}
+    needed = ['Age', 'BMI'] + list(RATIO_SOURCES.values()) + CATEGORICAL + ALL_TARGETS
+    df = data_store.read_dataset(path, columns=[c for c in dict.fromkeys(needed) if c in available])
+    X, names, baseline = build_features(df)
+    targets = [t for t in ALL_TARGETS if t in df.columns]
+    y = df[targets].to_numpy(dtype=np.float32)
+    metadata = {
+        'source': os.path.relpath(path, ROOT),
+        'source_sha256': source_hash,
+        'code_version': CODE_VERSION,
+        'rows': len(df),
+        'features': names,
+        'targets': targets,
+        'baseline_levels': baseline,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    # Written to a staging directory and renamed into place, so concurrent scripts never read
+    # a half-written entry
+    staging = f'{entry}.tmp-{os.getpid()}'
+    os.makedirs(staging, exist_ok=True)
+    try:
+        np.save(os.path.join(staging, 'features.npy'), X)
+        np.save(os.path.join(staging, 'targets.npy'), y)
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(staging, entry)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+
+
+def load(path=DATA_PATH, cache_dir=CACHE_DIR, refresh=False):
+    """Load the FeatureSet for path, building and caching it first if needed."""
+    import data_store
+    # Answered from the column cache's manifest unless the file changed since it was built
+    source_hash = data_store.source_sha256(path)
+    entry = os.path.join(cache_dir, f'{source_hash[:16]}-{CODE_VERSION}')
+    if refresh:
+        shutil.rmtree(entry, ignore_errors=True)
+    if not os.path.isdir(entry):
+        os.makedirs(cache_dir, exist_ok=True)
+        _build_entry(path, entry, source_hash)
+    with open(os.path.join(entry, 'meta.json')) as f:
+        metadata = json.load(f)
+    return FeatureSet(np.load(os.path.join(entry, 'features.npy')),
+                      np.load(os.path.join(entry, 'targets.npy')), metadata)
+
+
+def load_training_data(targets=MACRO_TARGETS, path=DATA_PATH):
+    """(X, y, feature names) ready for train_test_split, from the feature cache."""
+    feature_set = load(path)
+    X, y = feature_set.frames(targets)
+    return X, y, feature_set.features
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build (or check) the cached feature matrix.')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--refresh', action='store_true', help='rebuild even if a cache entry exists')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    feature_set = load(args.data, refresh=args.refresh)
+    print(f"Loaded {feature_set.X.shape[0]} rows x {feature_set.X.shape[1]} features "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"Features: {feature_set.features}")
+    print(f"Targets: {feature_set.targets}")
+
+
+if __name__ == '__main__':
+    main()
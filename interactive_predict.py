@@ -1,47 +1,11 @@
-import joblib
-import pandas as pd
-import numpy as np
-
-# Load the trained model
-MODEL_PATH = 'models/best_model_Advanced.joblib'
-model = joblib.load(MODEL_PATH)
+from predict import predict_calories
 
 def predict_nutrition(input_dict):
     """
-    Predicts nutrition values and returns confidence scores.
+    Predicts nutrition values, returned as np.array([calories, protein, carbs, fat]).
+    Calories are derived from the predicted macros (4 kcal/g protein and carbs, 9 kcal/g fat).
     """
-    df = pd.DataFrame([input_dict])
-    
-    # Get expected feature names from the model
-    expected_features = None
-    if hasattr(model, 'feature_names_'):
-        expected_features = list(model.feature_names_)
-    elif hasattr(model, 'estimators_') and len(model.estimators_) > 0:
-        if hasattr(model.estimators_[0], 'feature_names_'):
-            expected_features = list(model.estimators_[0].feature_names_)
-    
-    if expected_features is not None:
-        for col in expected_features:
-            if col not in df.columns:
-                df[col] = 0
-        df = df[expected_features]
-    
-    # Ensure all columns are numeric
-    df = df.apply(pd.to_numeric, errors='coerce').fillna(0)
-    
-    # Make prediction (only predicts protein, carbs, fat)
-    prediction = model.predict(df)
-    
-    # Handle both single and batch predictions
-    if prediction.ndim > 1:
-        prediction = prediction[0]
-    
-    protein, carbs, fat = prediction
-    
-    # Derive calories using nutrition science standards: 4 kcal/g for protein and carbs, 9 kcal/g for fat
-    calories = (protein * 4) + (carbs * 4) + (fat * 9)
-    
-    return np.array([calories, protein, carbs, fat])
+    return predict_calories(input_dict)
 
 def get_user_input():
     """
@@ -133,18 +97,17 @@ def get_user_input():
         input_dict['Chronic_Disease_hypertension'] = 1
     # None is default (all disease columns = 0)
     
-    # Store disease choice for advice
+    # Disease choice for advice is returned separately: the model schema rejects unknown keys
     disease_map = {
         '1': 'none',
         '2': 'diabetes',
         '3': 'heart_disease',
         '4': 'hypertension'
     }
-    input_dict['_disease_choice'] = disease_map.get(disease_choice, 'none')
     
-    return input_dict
+    return input_dict, disease_map.get(disease_choice, 'none')
 
-def display_results(predictions, confidence_scores, user_info):
+def display_results(predictions, confidence_scores, disease_choice):
     """
     Display predictions with confidence scores and practical recommendations.
     """
@@ -171,9 +134,7 @@ def display_results(predictions, confidence_scores, user_info):
     print(f"   • Carbs  : {carbs/30:3.1f} cups of rice/pasta (30g carbs each)")
     print(f"   • Fat    : {fat/14:3.1f} tbsp of olive oil/nuts (14g fat each)")
     
-    # Health condition specific advice - FIXED: Use the stored disease choice
-    disease_choice = user_info.get('_disease_choice', 'none')
-    
+    # Health condition specific advice
     if disease_choice == 'diabetes':
         print("\n🩺 DIABETES-SPECIFIC ADVICE:")
         print("   • Focus on low glycemic index carbs (oats, quinoa)")
@@ -214,13 +175,13 @@ def main():
     while True:
         try:
             # Get user input
-            user_input = get_user_input()
+            user_input, disease_choice = get_user_input()
             
             # Make prediction
             predictions = predict_nutrition(user_input)
             
             # Display results
-            display_results(predictions, confidence_scores, user_input)
+            display_results(predictions, confidence_scores, disease_choice)
             
             # Ask if user wants to try again
             print("\n" + "="*60)
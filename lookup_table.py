@@ -0,0 +1,200 @@
+"""
+Precomputed prediction table over the discrete serving input space.
+
+Serving inputs are almost discrete: integer ages, the three goal ratio presets used by
+interactive_predict.get_user_input and the frontend getRatios, one-hot gender and disease,
+and BMI. `build` scores that whole grid once (BMI at a configurable step) with the live model
+and stores it as a float32 .npy next to a JSON description. `LookupTable` memory-maps the
+table and answers in O(1) per row, interpolating linearly on BMI; rows outside the grid go to
+the live model, which is only loaded the first time such a row shows up. The JSON records
+the checksum of the model it was built from, and the API's lookup mode rebuilds a table
+that does not match the model it serves.
+
+Usage:
+    python lookup_table.py [--model models/best_model_Advanced.joblib] [--bmi-step 0.1]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+TABLE_PATH = 'models/lookup_table'
+
+# (Carb_ratio, Protein_ratio, Fat_ratio) for the lose / maintain / gain goals
+GOAL_PRESETS = [
+    (0.35, 0.35, 0.30),
+    (0.40, 0.30, 0.30),
+    (0.45, 0.30, 0.25),
+]
+RATIO_COLUMNS = ('Carb_ratio', 'Protein_ratio', 'Fat_ratio')
+ONE_HOT_PREFIXES = ('Gender_', 'Chronic_Disease_')
+
+
+def one_hot_groups(columns):
+    """Group one-hot columns by prefix; each group has len(cols) + 1 states (0 = baseline)."""
+    return [[c for c in columns if c.startswith(prefix)] for prefix in ONE_HOT_PREFIXES]
+
+
+def build(model, columns, age_min=18, age_max=100, bmi_min=10.0, bmi_max=60.0, bmi_step=0.1):
+    """Score the full grid with model; returns (table, metadata)."""
+    index = {c: i for i, c in enumerate(columns)}
+    groups = one_hot_groups(columns)
+    covered = set(RATIO_COLUMNS) | {'Age', 'BMI'} | {c for g in groups for c in g}
+    missing = covered - set(columns)
+    if missing:
+        raise ValueError(f"Model is missing grid columns: {sorted(missing)}")
+    uncovered = [c for c in columns if c not in covered]
+    if uncovered:
+        raise ValueError(f"Grid does not cover model columns: {uncovered}")
+
+    ages = np.arange(age_min, age_max + 1)
+    n_bmi = int(round((bmi_max - bmi_min) / bmi_step)) + 1
+    bmis = (bmi_min + bmi_step * np.arange(n_bmi)).astype(np.float32)
+    state_counts = [len(g) + 1 for g in groups]
+    shape = (len(ages), len(GOAL_PRESETS), *state_counts, n_bmi)
+
+    # Every (preset, one-hot states, bmi) combination for one age, in table order
+    inner = np.zeros((int(np.prod(shape[1:])), len(columns)), dtype=np.float32)
+    grid = np.indices(shape[1:]).reshape(len(shape) - 1, -1)
+    inner[:, index['BMI']] = bmis[grid[-1]]
+    presets = np.asarray(GOAL_PRESETS, dtype=np.float32)
+    for j, col in enumerate(RATIO_COLUMNS):
+        inner[:, index[col]] = presets[grid[0], j]
+    for g, cols in enumerate(groups):
+        states = grid[1 + g]
+        for k, col in enumerate(cols):
+            inner[:, index[col]] = states == k + 1
+
+    table = np.empty(shape + (3,), dtype=np.float32)
+    for a, age in enumerate(ages):
+        inner[:, index['Age']] = age
+        table[a] = np.asarray(model.predict(inner), dtype=np.float32).reshape(shape[1:] + (3,))
+
+    metadata = {
+        'columns': list(columns),
+        'age_min': int(age_min),
+        'age_max': int(age_max),
+        'bmi_min': float(bmi_min),
+        'bmi_step': float(bmi_step),
+        'n_bmi': n_bmi,
+        'presets': [list(p) for p in GOAL_PRESETS],
+        'groups': groups,
+        'shape': list(table.shape),
+    }
+    return table, metadata
+
+
+def save(table, metadata, path=TABLE_PATH):
+    """Write both files atomically: readers map either the old table or the new one, never half of one."""
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp + '.npy', 'wb') as f:
+        np.save(f, table)
+    with open(tmp + '.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp + '.npy', path + '.npy')
+    os.replace(tmp + '.json', path + '.json')
+
+
+class LookupTable:
+    """
+    O(1) predictor backed by a memory-mapped grid, with the same predict(X) interface as the
+    live model. `fallback` is a zero-argument callable returning the live model; it is called
+    lazily the first time a row falls outside the grid.
+    """
+
+    def __init__(self, table, metadata, fallback=None):
+        self.table = table
+        self.metadata = metadata
+        self.feature_names_ = list(metadata['columns'])
+        self._fallback_loader = fallback
+        self._fallback = None
+        self.fallback_rows = 0
+        index = {c: i for i, c in enumerate(self.feature_names_)}
+        self._age = index['Age']
+        self._bmi = index['BMI']
+        self._ratios = [index[c] for c in RATIO_COLUMNS]
+        self._groups = [[index[c] for c in g] for g in metadata['groups']]
+        self._presets = np.asarray(metadata['presets'], dtype=np.float32)
+
+    @classmethod
+    def load(cls, path=TABLE_PATH, fallback=None):
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+        return cls(np.load(path + '.npy', mmap_mode='r'), metadata, fallback)
+
+    @property
+    def fallback_model(self):
+        if self._fallback is None:
+            if self._fallback_loader is None:
+                raise ValueError("Input is outside the lookup grid and no fallback model is configured")
+            self._fallback = self._fallback_loader()
+        return self._fallback
+
+    def _locate(self, X):
+        """Grid coordinates for each row, plus a mask of rows the grid can answer."""
+        meta = self.metadata
+        age = X[:, self._age]
+        age_idx = age.astype(np.int64) - meta['age_min']
+        ok = (age == np.floor(age)) & (age_idx >= 0) & (age_idx <= meta['age_max'] - meta['age_min'])
+
+        matches = np.all(np.isclose(X[:, None, self._ratios], self._presets[None], atol=1e-4), axis=2)
+        ok &= matches.any(axis=1)
+        coords = [np.where(ok, age_idx, 0), matches.argmax(axis=1)]
+
+        for cols in self._groups:
+            onehot = X[:, cols]
+            ok &= np.all((onehot == 0) | (onehot == 1), axis=1) & (onehot.sum(axis=1) <= 1)
+            coords.append(np.where(onehot.any(axis=1), onehot.argmax(axis=1) + 1, 0))
+
+        pos = (X[:, self._bmi] - meta['bmi_min']) / meta['bmi_step']
+        ok &= (pos >= 0) & (pos <= meta['n_bmi'] - 1)
+        pos = np.clip(np.where(ok, pos, 0), 0, meta['n_bmi'] - 1)
+        return coords, pos, ok
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        coords, pos, ok = self._locate(X)
+        lo = np.minimum(np.floor(pos).astype(np.int64), self.metadata['n_bmi'] - 2)
+        frac = (pos - lo)[:, None]
+        cell = tuple(coords)
+        out = self.table[cell + (lo,)] * (1 - frac) + self.table[cell + (lo + 1,)] * frac
+        out = out.astype(np.float64)
+        if not ok.all():
+            miss = ~ok
+            self.fallback_rows += int(miss.sum())
+            out[miss] = self.fallback_model.predict(X[miss])
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the serving lookup table.')
+    parser.add_argument('--model', default='models/best_model_Advanced.joblib')
+    parser.add_argument('--output', default=TABLE_PATH)
+    parser.add_argument('--age-min', type=int, default=18)
+    parser.add_argument('--age-max', type=int, default=100)
+    parser.add_argument('--bmi-min', type=float, default=10.0)
+    parser.add_argument('--bmi-max', type=float, default=60.0)
+    parser.add_argument('--bmi-step', type=float, default=0.1)
+    args = parser.parse_args()
+
+    import joblib
+    from feature_schema import model_feature_names
+
+    model = joblib.load(args.model)
+    start = time.perf_counter()
+    table, metadata = build(model, model_feature_names(model), args.age_min, args.age_max,
+                            args.bmi_min, args.bmi_max, args.bmi_step)
+    metadata['model_path'] = args.model
+    with open(args.model, 'rb') as f:
+        metadata['model_version'] = hashlib.sha256(f.read()).hexdigest()[:12]
+    save(table, metadata, args.output)
+    print(f"Scored {table[..., 0].size} grid points in {time.perf_counter() - start:.1f}s")
+    print(f"Lookup table saved to {args.output}.npy ({table.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
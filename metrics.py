@@ -0,0 +1,160 @@
+"""
+Low-overhead request metrics rendered in the Prometheus text format.
+
+Counters and fixed-bucket histograms are plain Python objects (no client library). A
+`StageTimer` marks the end of each stage of a request with one perf_counter() call, and
+`record` folds the stage durations into the `nutricare_stage_seconds` histogram once the
+request is done. `MetricsMiddleware` is a pure ASGI middleware (cheaper than Starlette's
+BaseHTTPMiddleware) counting requests, errors and total latency per route.
+
+NUTRICARE_METRICS=0 turns all of it off.
+"""
+import bisect
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('NUTRICARE_METRICS', '1') != '0'
+
+# Seconds; request stages range from microseconds (vectorize) to tens of ms (cold predict)
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{v}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self.series = {}  # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = _labels(self.labelnames + ('le',), labels + (bound,))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+requests_total = Counter('nutricare_requests_total', 'HTTP requests by route and status code', ('route', 'status'))
+errors_total = Counter('nutricare_errors_total', 'HTTP responses with status >= 400, or unhandled exceptions', ('route', 'status'))
+request_seconds = Histogram('nutricare_request_seconds', 'Total request latency by route', labelnames=('route',))
+stage_seconds = Histogram('nutricare_stage_seconds', 'Latency of each request stage', labelnames=('route', 'stage'))
+batch_rows = Histogram('nutricare_batch_rows', 'Rows per /predict/batch request', SIZE_BUCKETS)
+model_predict_seconds = Histogram('nutricare_model_predict_seconds', 'Latency of each model.predict call')
+model_predict_rows = Histogram('nutricare_model_predict_rows', 'Rows scored per model.predict call (micro-batch size for /predict)', SIZE_BUCKETS)
+
+REGISTRY = [requests_total, errors_total, request_seconds, stage_seconds, batch_rows,
+            model_predict_seconds, model_predict_rows]
+
+
+class StageTimer:
+    """Stage durations of one request; mark(stage) ends the stage that started at the previous mark."""
+
+    __slots__ = ('last', 'stages')
+
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def server_timing(self):
+        """Stages as a Server-Timing header value (durations in ms)."""
+        return ', '.join(f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in self.stages)
+
+
+def record(route, timer):
+    if ENABLED:
+        for stage, seconds in timer.stages:
+            stage_seconds.observe(seconds, route, stage)
+
+
+def sample(name, help, kind, value, labels=''):
+    """Exposition lines for one gauge or counter value read from elsewhere (cache, batcher)."""
+    return [f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name}{labels} {value}']
+
+
+def render(extra=()):
+    """All metrics, plus any pre-rendered lines in extra, as Prometheus exposition text."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Counts requests and errors and times them per route template (unknown paths count as 'other')."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        route = scope['path'] if scope['path'] in self.routes else 'other'
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_seconds.observe(time.perf_counter() - start, route)
+            requests_total.inc(route, str(status[0]))
+            if status[0] >= 400:
+                errors_total.inc(route, str(status[0]))
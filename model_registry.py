@@ -0,0 +1,186 @@
+"""
+Versioned model registry with an atomic "current" pointer.
+
+Each registered artifact is copied to models/registry/<version>/ next to a metadata.json
+(features, metrics, checksum, source). The version is the first 12 hex digits of the
+artifact's sha256, the same id the API already puts in its cache keys, so registering the
+same file twice is a no-op. models/registry/CURRENT names the version to serve plus the
+stack of previously promoted versions; it is only ever rewritten with os.replace, so a
+reader sees either the old or the new pointer, never a partial one.
+
+The API (NUTRICARE_SERVING_MODE=registry) polls CURRENT and hot-swaps to whatever it names.
+
+Usage:
+    python model_registry.py register models/best_model_Advanced.joblib [--metric R2=0.93] [--promote]
+    python model_registry.py promote <version>
+    python model_registry.py rollback
+    python model_registry.py list
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+REGISTRY_DIR = os.environ.get('NUTRICARE_REGISTRY_DIR', 'models/registry')
+POINTER = 'CURRENT'
+METADATA = 'metadata.json'
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def version_dir(version, registry=REGISTRY_DIR):
+    return os.path.join(registry, version)
+
+
+def read_metadata(version, registry=REGISTRY_DIR):
+    path = os.path.join(version_dir(version, registry), METADATA)
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown model version '{version}'")
+    with open(path) as f:
+        return json.load(f)
+
+
+def artifact_path(version, registry=REGISTRY_DIR):
+    """Path of the model file registered as version."""
+    return os.path.join(version_dir(version, registry), read_metadata(version, registry)['artifact'])
+
+
+def register(model_path, metrics=None, registry=REGISTRY_DIR):
+    """Copy model_path into the registry and return its metadata. Does not promote it."""
+    from feature_schema import model_feature_names
+    from predict import file_checksum, load_model
+
+    checksum = file_checksum(model_path)
+    version = checksum[:12]
+    target = version_dir(version, registry)
+    if os.path.exists(target):
+        return read_metadata(version, registry)
+
+    model = load_model(model_path)
+    artifact = 'model' + os.path.splitext(model_path)[1]
+    metadata = {
+        'version': version,
+        'checksum': checksum,
+        'artifact': artifact,
+        'source_path': model_path,
+        'model_type': type(model).__name__,
+        'features': model_feature_names(model),
+        'metrics': metrics or {},
+        'registered_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    # Stage in a temporary directory and rename it into place, so a half-copied
+    # version directory is never visible to promote or to the API
+    os.makedirs(registry, exist_ok=True)
+    staging = f'{target}.tmp-{os.getpid()}'
+    os.makedirs(staging)
+    try:
+        shutil.copyfile(model_path, os.path.join(staging, artifact))
+        _write_atomic(os.path.join(staging, METADATA), metadata)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return metadata
+
+
+def read_pointer(registry=REGISTRY_DIR):
+    """Contents of CURRENT: {'version', 'previous', 'promoted_at'}, or None before the first promote."""
+    try:
+        with open(os.path.join(registry, POINTER)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_version(registry=REGISTRY_DIR):
+    pointer = read_pointer(registry)
+    return pointer['version'] if pointer else None
+
+
+def promote(version, registry=REGISTRY_DIR):
+    """Point CURRENT at version, remembering the version it replaces for rollback."""
+    read_metadata(version, registry)  # raises for unknown versions
+    pointer = read_pointer(registry)
+    previous = []
+    if pointer is not None:
+        if pointer['version'] == version:
+            return pointer
+        previous = pointer['previous'] + [pointer['version']]
+    pointer = {'version': version, 'previous': previous, 'promoted_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+    _write_atomic(os.path.join(registry, POINTER), pointer)
+    return pointer
+
+
+def rollback(registry=REGISTRY_DIR):
+    """Point CURRENT back at the previously promoted version."""
+    pointer = read_pointer(registry)
+    if not pointer or not pointer['previous']:
+        raise ValueError("No previous version to roll back to")
+    pointer = {'version': pointer['previous'][-1], 'previous': pointer['previous'][:-1],
+               'promoted_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+    _write_atomic(os.path.join(registry, POINTER), pointer)
+    return pointer
+
+
+def list_versions(registry=REGISTRY_DIR):
+    """Metadata of every registered version, oldest first."""
+    if not os.path.isdir(registry):
+        return []
+    versions = [read_metadata(name, registry) for name in os.listdir(registry)
+                if os.path.exists(os.path.join(registry, name, METADATA))]
+    return sorted(versions, key=lambda m: m['registered_at'])
+
+
+def parse_metric(text):
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{text}'")
+    try:
+        return name, float(value)
+    except ValueError:
+        return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the versioned model registry.')
+    parser.add_argument('--registry', default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    reg = commands.add_parser('register', help='add a model artifact to the registry')
+    reg.add_argument('model', help='path to a .joblib or compiled .npz model')
+    reg.add_argument('--metric', type=parse_metric, action='append', default=[], help='NAME=VALUE, repeatable')
+    reg.add_argument('--promote', action='store_true', help='also make it the current version')
+    commands.add_parser('promote', help='make a registered version current').add_argument('version')
+    commands.add_parser('rollback', help='go back to the previously promoted version')
+    commands.add_parser('list', help='show registered versions')
+    args = parser.parse_args()
+
+    if args.command == 'register':
+        metadata = register(args.model, dict(args.metric), args.registry)
+        print(f"Registered {args.model} as version {metadata['version']}")
+        if args.promote:
+            promote(metadata['version'], args.registry)
+            print(f"Current version is now {metadata['version']}")
+    elif args.command == 'promote':
+        promote(args.version, args.registry)
+        print(f"Current version is now {args.version}")
+    elif args.command == 'rollback':
+        pointer = rollback(args.registry)
+        print(f"Rolled back; current version is now {pointer['version']}")
+    else:
+        current = current_version(args.registry)
+        for m in list_versions(args.registry):
+            marker = '*' if m['version'] == current else ' '
+            metrics = ', '.join(f'{k}={v}' for k, v in m['metrics'].items())
+            print(f"{marker} {m['version']}  {m['registered_at']}  {m['model_type']:<24} {m['source_path']}  {metrics}")
+
+
+if __name__ == '__main__':
+    main()
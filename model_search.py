@@ -0,0 +1,192 @@
+"""
+Successive-halving hyperparameter search for the training scripts.
+
+`halving_search` wraps sklearn's HalvingRandomSearchCV: every candidate starts on a small
+budget and only the best third moves on to the next round, which gets three times the
+budget. The budget is the tree count for forests ('estimator__n_estimators'), and training
+rows ('n_samples') for boosters. Boosters wrapped in `EarlyStopping` also stop adding
+trees once a held-out validation fold stops improving, so their n_estimators is only a cap.
+Candidate fits run in parallel under the parallel_training CPU budget, with each
+library's own threading capped at one thread per fit.
+
+`forest_curve_search` tunes a random forest's tree count by growing each sampled setting
+once with warm_start and scoring every tree-count checkpoint on the way.
+"""
+import time
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+
+
+class EarlyStopping(RegressorMixin, BaseEstimator):
+    """
+    Fits a booster on all but validation_fraction of the rows and stops once the validation
+    loss has not improved for `rounds` rounds. Works with XGBoost, LightGBM, CatBoost and
+    sklearn's GradientBoostingRegressor (which holds out its own validation fold).
+    """
+
+    def __init__(self, estimator, validation_fraction=0.1, rounds=20, random_state=42):
+        self.estimator = estimator
+        self.validation_fraction = validation_fraction
+        self.rounds = rounds
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        from sklearn.model_selection import train_test_split
+
+        estimator = clone(self.estimator)
+        module = type(estimator).__module__
+        if module.startswith('sklearn'):
+            estimator.set_params(n_iter_no_change=self.rounds, validation_fraction=self.validation_fraction)
+            estimator.fit(X, y)
+        else:
+            X_fit, X_val, y_fit, y_val = train_test_split(
+                X, y, test_size=self.validation_fraction, random_state=self.random_state)
+            if module.startswith('xgboost'):
+                estimator.set_params(early_stopping_rounds=self.rounds)
+                estimator.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+            elif module.startswith('lightgbm'):
+                import lightgbm
+                estimator.fit(X_fit, y_fit, eval_set=[(X_val, y_val)],
+                              callbacks=[lightgbm.early_stopping(self.rounds, verbose=False)])
+            elif module.startswith('catboost'):
+                estimator.fit(X_fit, y_fit, eval_set=(X_val, y_val), early_stopping_rounds=self.rounds)
+            else:
+                raise ValueError(f"EarlyStopping does not support {type(estimator).__name__}")
+        self.estimator_ = estimator
+        self.n_features_in_ = estimator.n_features_in_
+        if hasattr(estimator, 'feature_names_in_'):
+            self.feature_names_in_ = estimator.feature_names_in_
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
+
+
+def _cap_threads(model, threads):
+    """Set the thread count of the innermost estimator(s) of a (possibly nested) model."""
+    from parallel_training import set_threads
+
+    for param in model.get_params(deep=True).values():
+        # CatBoost models are not sklearn BaseEstimators, so duck-type the check
+        if hasattr(param, 'fit') and hasattr(param, 'get_params') and 'estimator' not in param.get_params(deep=False):
+            set_threads(param, threads)
+    return model
+
+
+def halving_search(model, param_distributions, X, y, resource='n_samples', max_resources='auto',
+                   min_resources='exhaust', factor=3, n_candidates='exhaust', cv=3, cpus=None,
+                   random_state=42):
+    """
+    Successive-halving random search of model over param_distributions.
+    Returns:
+        (fitted HalvingRandomSearchCV, wall seconds)
+    """
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV
+    from parallel_training import cpu_budget
+
+    # Plenty of candidate fits to go round, so one thread each and as many at once as CPUs
+    n_jobs = cpu_budget(cpus)
+    search = HalvingRandomSearchCV(
+        _cap_threads(clone(model), 1), param_distributions, n_candidates=n_candidates,
+        factor=factor, resource=resource, max_resources=max_resources, min_resources=min_resources,
+        cv=cv, scoring='r2', n_jobs=n_jobs, random_state=random_state)
+    start = time.perf_counter()
+    search.fit(X, y)
+    return search, time.perf_counter() - start
+
+
+def _grow_fold(base, params, checkpoints, X_fit, y_fit, X_val, y_val):
+    """
+    MSE of a forest grown with warm_start through each tree-count checkpoint, one forest per
+    target. Returns (validation mse, training mse, cumulative fit seconds, cumulative
+    validation predict seconds), each per checkpoint.
+    """
+    X_fit, X_val = np.asarray(X_fit), np.asarray(X_val)
+    mse = np.zeros(len(checkpoints))
+    train_mse = np.zeros(len(checkpoints))
+    fit_seconds = np.zeros(len(checkpoints))
+    score_seconds = np.zeros(len(checkpoints))
+    for j in range(y_fit.shape[1]):
+        forest = clone(base).set_params(warm_start=True, n_jobs=1, **params)
+        tree_sum = np.zeros(len(X_val))
+        train_sum = np.zeros(len(X_fit))
+        grown, elapsed, scoring = 0, 0.0, 0.0
+        for k, n_trees in enumerate(checkpoints):
+            start = time.perf_counter()
+            forest.set_params(n_estimators=n_trees).fit(X_fit, y_fit[:, j])
+            elapsed += time.perf_counter() - start
+            # A forest predicts the mean of its trees, so only the new trees need predicting
+            start = time.perf_counter()
+            for tree in forest.estimators_[grown:]:
+                tree_sum += tree.predict(X_val)
+            scoring += time.perf_counter() - start
+            for tree in forest.estimators_[grown:]:
+                train_sum += tree.predict(X_fit)
+            grown = n_trees
+            mse[k] += np.mean((y_val[:, j] - tree_sum / n_trees) ** 2)
+            train_mse[k] += np.mean((y_fit[:, j] - train_sum / n_trees) ** 2)
+            fit_seconds[k] += elapsed
+            score_seconds[k] += scoring
+    # Averaged over targets, like neg_mean_squared_error on a multi-output model
+    return mse / y_fit.shape[1], train_mse / y_fit.shape[1], fit_seconds, score_seconds
+
+
+def forest_curve_search(base, param_distributions, X, y, n_iter=20, cv=5, cpus=None, random_state=42):
+    """
+    Random search over a forest's parameters that scores every tree count listed under
+    param_distributions['n_estimators']: each sampled setting grows one warm-started forest
+    per fold and target instead of a new forest per tree count. sklearn seeds warm-started
+    trees exactly like a fresh fit, so a checkpoint scores the same as a forest trained at
+    that size.
+    Returns:
+        DataFrame in the RandomizedSearchCV(return_train_score=True).cv_results_ layout, one
+        row per setting x checkpoint; fit and score times are those of growing and scoring
+        the forest up to that checkpoint
+    """
+    import pandas as pd
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import KFold, ParameterSampler
+    from parallel_training import cpu_budget
+
+    checkpoints = sorted(param_distributions['n_estimators'])
+    # The draws RandomizedSearchCV would make (same keys, same seed), minus the tree count
+    settings = []
+    for params in ParameterSampler(param_distributions, n_iter, random_state=random_state):
+        # Parameter column order of cv_results_
+        names = list(params)
+        params = {k: v for k, v in params.items() if k != 'n_estimators'}
+        if params not in settings:
+            settings.append(params)
+    y = np.asarray(y)
+    folds = list(KFold(cv).split(X))
+    X_rows = X.iloc if hasattr(X, 'iloc') else X
+
+    scored = Parallel(n_jobs=cpu_budget(cpus))(
+        delayed(_grow_fold)(base, params, checkpoints, X_rows[fit], y[fit], X_rows[val], y[val])
+        for params in settings for fit, val in folds)
+
+    rows = []
+    for i, params in enumerate(settings):
+        fold_mse, fold_train_mse, fold_seconds, fold_score_seconds = (
+            np.array([scored[i * cv + f][m] for f in range(cv)]) for m in range(4))
+        for k, n_trees in enumerate(checkpoints):
+            row = {'mean_fit_time': fold_seconds[:, k].mean(), 'std_fit_time': fold_seconds[:, k].std(),
+                   'mean_score_time': fold_score_seconds[:, k].mean(),
+                   'std_score_time': fold_score_seconds[:, k].std()}
+            grid = {f'estimator__{name}': n_trees if name == 'n_estimators' else params[name] for name in names}
+            row.update({f'param_{name}': value for name, value in grid.items()})
+            row['params'] = grid
+            for f in range(cv):
+                row[f'split{f}_test_score'] = -fold_mse[f, k]
+            row['mean_test_score'] = -fold_mse[:, k].mean()
+            row['std_test_score'] = fold_mse[:, k].std()
+            row['rank_test_score'] = 0
+            for f in range(cv):
+                row[f'split{f}_train_score'] = -fold_train_mse[f, k]
+            row['mean_train_score'] = -fold_train_mse[:, k].mean()
+            row['std_train_score'] = fold_train_mse[:, k].std()
+            rows.append(row)
+    results = pd.DataFrame(rows)
+    results['rank_test_score'] = results['mean_test_score'].rank(ascending=False, method='min').astype(int)
+    return results
@@ -0,0 +1,306 @@
+"""
+Python client for predict_api.
+
+`AsyncNutriCareClient` keeps one pooled httpx.AsyncClient (keep-alive connections, at
+most `concurrency` of them) for its whole life. `predict_many` cuts a list of profiles into
+chunks of batch_size and keeps up to `concurrency` chunks in flight, so the next chunk is
+being prepared and sent while earlier ones are scored. By default a chunk is vectorized on
+the client with the served FeatureSchema (fetched once from /schema) and sent to
+/predict/binary as raw float32 rows, which skips JSON on both sides; binary=False sends
+JSON to /predict/batch instead. Either way the results come back in input order, in the
+/predict/batch result format, with invalid profiles reported per row.
+
+Connection errors, timeouts and 429/502/503/504 answers (503 while the model is still
+loading) are retried with exponential backoff and jitter. Every HTTP call is timed, and
+`stats()` summarises calls, rows, retries and latency percentiles per route.
+
+`NutriCareClient` is the synchronous wrapper for scripts; it runs the async client on its
+own event loop, so the connection pool survives between calls.
+
+Usage:
+    with NutriCareClient('http://localhost:8000') as client:
+        result = client.predict({'Age': 30, 'BMI': 24.5, 'Carb_ratio': 0.4, ...})
+        batch = client.predict_many(profiles)   # {'results': [...], 'errors': [...]}
+
+    python nutricare_client.py [--url http://localhost:8000] [--rows 100000] [--json]
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+import httpx
+import numpy as np
+from feature_schema import FeatureSchema
+from nutrient_tags import tag_predictions
+
+# Worth another attempt: overloaded, restarting or still loading the model
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Per-call timing records kept for stats()
+STATS_WINDOW = 10000
+
+
+class SchemaChanged(Exception):
+    """The served model's feature layout no longer matches the rows that were sent (409)."""
+
+
+class AsyncNutriCareClient:
+    def __init__(self, base_url='http://localhost:8000', batch_size=2000, concurrency=4, binary=True,
+                 timeout=30.0, retries=3, backoff=0.1, server_timing=False):
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.binary = binary
+        self.retries = retries
+        self.backoff = backoff
+        self.server_timing = server_timing
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url, timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        self._schema = None
+        self._calls = deque(maxlen=STATS_WINDOW)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _request(self, method, path, rows=0, **kwargs):
+        """One HTTP call, retried on connection errors and RETRY_STATUSES, and timed."""
+        if self.server_timing:
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'X-NutriCare-Timing': '1'}
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    self._record(path, rows, None, attempt, start)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    break
+            # Full jitter, so clients that failed together do not retry together
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        self._record(path, rows, response.status_code, attempt, start, response.headers.get('server-timing'))
+        return response
+
+    def _record(self, path, rows, status, retries, start, server_timing=None):
+        self._calls.append({'route': path, 'rows': rows, 'status': status, 'retries': retries,
+                            'seconds': time.perf_counter() - start, 'server_timing': server_timing})
+
+    def calls(self):
+        """The most recent per-call records (route, rows, status, retries, seconds, server_timing)."""
+        return list(self._calls)
+
+    def stats(self):
+        """Per route: calls, rows, errors, retries and latency percentiles (ms) of the recorded calls."""
+        routes = {}
+        for call in self._calls:
+            routes.setdefault(call['route'], []).append(call)
+        summary = {}
+        for route, calls in routes.items():
+            seconds = np.array([c['seconds'] for c in calls])
+            summary[route] = {
+                'calls': len(calls),
+                'rows': sum(c['rows'] for c in calls),
+                'errors': sum(c['status'] != 200 for c in calls),
+                'retries': sum(c['retries'] for c in calls),
+                'total_seconds': float(seconds.sum()),
+                'latency_ms': {'mean': float(seconds.mean() * 1000),
+                               'p50': float(np.percentile(seconds, 50) * 1000),
+                               'p95': float(np.percentile(seconds, 95) * 1000),
+                               'p99': float(np.percentile(seconds, 99) * 1000),
+                               'max': float(seconds.max() * 1000)},
+            }
+        return summary
+
+    async def schema(self, refresh=False):
+        """The served FeatureSchema, from /schema (fetched once, again with refresh=True)."""
+        if self._schema is None or refresh:
+            response = await self._request('GET', '/schema')
+            response.raise_for_status()
+            info = response.json()
+            schema = FeatureSchema(info['columns'])
+            if schema.digest != info['digest']:
+                raise SchemaChanged(f"server schema digest {info['digest']} does not match this client's "
+                                    f"{schema.digest}; feature_schema.py is out of date")
+            self._schema = schema
+        return self._schema
+
+    async def predict(self, profile):
+        """Result dict for one profile, from /predict (which micro-batches and caches on the server)."""
+        response = await self._request('POST', '/predict', rows=1, json=profile)
+        response.raise_for_status()
+        return response.json()
+
+    async def _post_matrix(self, X, headers):
+        """(outputs array, model version) from /predict/binary."""
+        headers = {**headers, 'Content-Type': 'application/octet-stream'}
+        response = await self._request('POST', '/predict/binary', rows=len(X), content=X.tobytes(),
+                                       headers=headers)
+        if response.status_code == 409:
+            raise SchemaChanged(response.json()['detail'])
+        response.raise_for_status()
+        return np.frombuffer(response.content, dtype='<f4').reshape(-1, 4), response.headers['x-model-version']
+
+    async def predict_matrix(self, X, columns=None):
+        """
+        (len(X), 4) float32 array of protein, carbs, fat and calories for a feature matrix.
+        X is in the order of columns, or of the served schema when columns is None. Raises
+        SchemaChanged if the served layout no longer matches.
+        """
+        X = np.ascontiguousarray(X, dtype='<f4')
+        if columns is not None:
+            headers = {'X-Columns': ','.join(columns)}
+        else:
+            headers = {'X-Schema-Digest': (await self.schema()).digest}
+        return (await self._post_matrix(X, headers))[0]
+
+    async def _binary_chunk(self, profiles, offset):
+        schema = await self.schema()
+        X = np.zeros((len(profiles), schema.n_features), dtype=np.float32)
+        index, errors = [], []
+        for i, profile in enumerate(profiles):
+            row = X[len(index)]
+            try:
+                schema.fill(row, profile)
+            except ValueError as e:
+                row[:] = 0
+                errors.append({'index': offset + i, 'error': str(e)})
+                continue
+            index.append(i)
+        results = [None] * len(profiles)
+        if not index:
+            return results, errors
+        try:
+            out, version = await self._post_matrix(X[:len(index)], {'X-Schema-Digest': schema.digest})
+        except SchemaChanged:
+            # The server switched to a model with other columns: refetch and redo this chunk
+            if (await self.schema(refresh=True)).digest == schema.digest:
+                raise
+            return await self._binary_chunk(profiles, offset)
+        tags = tag_predictions(out[:, :3])
+        for i, (protein, carbs, fat, calories), tag in zip(index, out.tolist(), tags):
+            results[i] = {'protein': protein, 'carbs': carbs, 'fat': fat, 'calories': calories,
+                          'nutrient_tag': tag, 'model_version': version}
+        return results, errors
+
+    async def _json_chunk(self, profiles, offset):
+        response = await self._request('POST', '/predict/batch', rows=len(profiles), json=profiles)
+        response.raise_for_status()
+        body = response.json()
+        errors = [{'index': offset + e['index'], 'error': e['error']} for e in body['errors']]
+        return body['results'], errors
+
+    async def predict_many(self, profiles):
+        """
+        {'results': [...], 'errors': [...]} for a list of profiles, like /predict/batch but
+        for any number of them: results[i] is the result for profiles[i] (None if invalid)
+        and each error is {'index', 'error'}.
+        """
+        profiles = list(profiles)
+        limit = asyncio.Semaphore(self.concurrency)
+        score = self._binary_chunk if self.binary else self._json_chunk
+
+        async def run(start):
+            async with limit:
+                return await score(profiles[start:start + self.batch_size], start)
+
+        chunks = await asyncio.gather(*(run(start) for start in range(0, len(profiles), self.batch_size)))
+        results, errors = [], []
+        for chunk_results, chunk_errors in chunks:
+            results.extend(chunk_results)
+            errors.extend(chunk_errors)
+        return {'results': results, 'errors': errors}
+
+
+class NutriCareClient:
+    """Synchronous AsyncNutriCareClient for scripts; takes the same arguments."""
+
+    def __init__(self, base_url='http://localhost:8000', **options):
+        self._loop = asyncio.new_event_loop()
+        self._client = self._loop.run_until_complete(self._open(base_url, options))
+
+    @staticmethod
+    async def _open(base_url, options):
+        # httpx binds its connection pool to the loop it is created on
+        return AsyncNutriCareClient(base_url, **options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self._loop.is_closed():
+            self._loop.run_until_complete(self._client.aclose())
+            self._loop.close()
+
+    def schema(self, refresh=False):
+        return self._loop.run_until_complete(self._client.schema(refresh))
+
+    def predict(self, profile):
+        return self._loop.run_until_complete(self._client.predict(profile))
+
+    def predict_matrix(self, X, columns=None):
+        return self._loop.run_until_complete(self._client.predict_matrix(X, columns))
+
+    def predict_many(self, profiles):
+        return self._loop.run_until_complete(self._client.predict_many(profiles))
+
+    def calls(self):
+        return self._client.calls()
+
+    def stats(self):
+        return self._client.stats()
+
+
+def sample_profiles(n_rows, seed=0):
+    """n_rows random profiles in the form the React app sends."""
+    rng = random.Random(seed)
+    goals = [(0.35, 0.35, 0.30), (0.40, 0.30, 0.30), (0.45, 0.30, 0.25)]
+    diseases = ['Chronic_Disease_heart_disease', 'Chronic_Disease_hypertension', 'Chronic_Disease_obesity',
+                'Chronic_Disease_none', 'Chronic_Disease_diabetes']
+    profiles = []
+    for _ in range(n_rows):
+        carb, protein, fat = rng.choice(goals)
+        profiles.append({'Age': rng.randint(18, 80), 'BMI': round(rng.uniform(17, 40), 1), 'Carb_ratio': carb,
+                         'Protein_ratio': protein, 'Fat_ratio': fat, 'Gender_Male': rng.randint(0, 1),
+                         rng.choice(diseases): 1})
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score random profiles through predict_api and report throughput.')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help='send JSON to /predict/batch instead of /predict/binary')
+    args = parser.parse_args()
+
+    profiles = sample_profiles(args.rows)
+    with NutriCareClient(args.url, batch_size=args.batch_size, concurrency=args.concurrency,
+                         binary=not args.json) as client:
+        client.schema()
+        start = time.perf_counter()
+        client_cpu = time.process_time()
+        batch = client.predict_many(profiles)
+        seconds = time.perf_counter() - start
+        cpu = time.process_time() - client_cpu
+        print(f"Scored {args.rows - len(batch['errors'])} profiles in {seconds:.2f}s "
+              f"({args.rows / seconds:,.0f} rows/s, client CPU {cpu:.2f}s, {len(batch['errors'])} errors)")
+        for route, summary in client.stats().items():
+            latency = summary['latency_ms']
+            print(f"{route}: {summary['calls']} calls, {summary['retries']} retries, "
+                  f"p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, max {latency['max']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
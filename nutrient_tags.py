@@ -0,0 +1,85 @@
+"""
+Rule engine for nutrient tags (low_carb, high_protein, ...).
+
+RULES is an ordered table: each rule is a tag plus a list of (column, operator, value)
+conditions that must all hold. The first matching rule wins, and rows matching none get
+DEFAULT_TAG. Every condition is evaluated over whole columns and the winner picked with one
+np.select, so tagging costs a few array passes no matter how many rows there are. A new tag
+is a new line in the table.
+
+The same rules tag the dataset (Dataset/tag_nutrients.py, in memory or chunked) and the
+API's predictions (tag_predictions maps protein/carbs/fat onto the Recommended_* columns).
+"""
+import operator
+import numpy as np
+
+DEFAULT_TAG = 'balanced'
+RULES = [
+    ('low_carb', [('Recommended_Carbs', '<', 100)]),
+    ('high_protein', [('Recommended_Protein', '>', 150)]),
+    ('low_fat', [('Recommended_Fats', '<', 60)]),
+]
+
+# The operator functions compare whole arrays and plain scalars alike
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Columns of a macro prediction (predict.py order), as dataset column names
+PREDICTION_COLUMNS = ['Recommended_Protein', 'Recommended_Carbs', 'Recommended_Fats']
+
+
+def required_columns(rules=RULES):
+    return sorted({column for _, conditions in rules for column, _, _ in conditions})
+
+
+def _rule_mask(columns, conditions, n):
+    mask = np.ones(n, dtype=bool)
+    for column, op, value in conditions:
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}' in nutrient tag rule on {column}")
+        mask &= OPERATORS[op](np.asarray(columns[column]), value)
+    return mask
+
+
+def tag_columns(columns, rules=RULES, default=DEFAULT_TAG):
+    """
+    Tags for every row of columns (a DataFrame or a dict of equal-length arrays).
+    Returns:
+        object array of tag strings
+    """
+    n = len(np.asarray(columns[required_columns(rules)[0]]))
+    conditions = [_rule_mask(columns, when, n) for _, when in rules]
+    # Select the rule index rather than the string, then look the labels up in one take
+    codes = np.select(conditions, np.arange(len(rules)), default=len(rules))
+    labels = np.array([tag for tag, _ in rules] + [default], dtype=object)
+    return labels[codes]
+
+
+def tag_row(values, rules=RULES, default=DEFAULT_TAG):
+    """Tag of a single row (a mapping of column -> number), walking the same rule table."""
+    for tag, conditions in rules:
+        if all(OPERATORS[op](values[column], value) for column, op, value in conditions):
+            return tag
+    return default
+
+
+def tag_prediction(protein, carbs, fat, rules=RULES, default=DEFAULT_TAG):
+    """Tag of one predicted macro triple; the per-request path of /predict."""
+    values = dict(zip(PREDICTION_COLUMNS, (protein, carbs, fat)))
+    values['Recommended_Calories'] = protein * 4 + carbs * 4 + fat * 9
+    return tag_row(values, rules, default)
+
+
+def tag_predictions(predictions, rules=RULES, default=DEFAULT_TAG):
+    """Tags for an (n, 3) array of protein, carbs, fat predictions."""
+    predictions = np.asarray(predictions, dtype=np.float64).reshape(-1, len(PREDICTION_COLUMNS))
+    columns = {name: predictions[:, j] for j, name in enumerate(PREDICTION_COLUMNS)}
+    # Rules may also test calories, which are derived rather than predicted
+    columns['Recommended_Calories'] = predictions @ np.array([4.0, 4.0, 9.0])
+    return tag_columns(columns, rules, default)
@@ -0,0 +1,142 @@
+"""
+Train several multi-output models concurrently under one CPU budget.
+
+Every (model, target) pair is an independent fit, so `train` runs them in a process pool
+and assembles each model's fitted per-target estimators into a MultiOutputRegressor, the
+same object MultiOutputRegressor.fit would have produced. The CPU budget (--cpus,
+NUTRICARE_CPUS, or the CPUs this process may run on) is split between pool workers and
+each library's own threads (n_jobs / thread_count, plus the OpenMP/BLAS env vars in each
+worker), so workers x threads never exceeds it.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+# State of a pool worker, set once by _init_worker so tasks do not re-send the data
+_worker = {}
+
+
+def cpu_budget(requested=None):
+    """CPUs available for training."""
+    if requested:
+        return requested
+    if os.environ.get('NUTRICARE_CPUS'):
+        return int(os.environ['NUTRICARE_CPUS'])
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def split_budget(budget, n_tasks, workers=None):
+    """(pool workers, threads per fit) so that workers * threads <= budget."""
+    workers = max(1, min(workers or budget, n_tasks, budget))
+    return workers, max(1, budget // workers)
+
+
+def _thread_param(estimator):
+    # CatBoost's get_params only lists explicitly set parameters, so check it by module
+    if type(estimator).__module__.startswith('catboost'):
+        return 'thread_count'
+    return 'n_jobs' if 'n_jobs' in estimator.get_params(deep=False) else None
+
+
+def set_threads(estimator, threads):
+    """Cap an estimator's internal threads; returns the previous setting for restore_threads."""
+    param = _thread_param(estimator)
+    if param is None:
+        return None
+    previous = estimator.get_params(deep=False).get(param, -1)
+    estimator.set_params(**{param: threads})
+    return param, previous
+
+
+def restore_threads(estimator, saved):
+    # A fitted CatBoost model rejects set_params, and its predict() takes its own
+    # thread_count, so only the other libraries need their setting put back
+    if saved is not None and saved[0] != 'thread_count':
+        param, previous = saved
+        estimator.set_params(**{param: previous})
+
+
+def _init_worker(X, y, threads):
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    _worker.update(X=X, y=y, threads=threads, pooled=True)
+
+
+def _fit_one(task):
+    from sklearn.base import clone
+
+    name, target, estimator = task
+    estimator = clone(estimator)
+    saved = set_threads(estimator, _worker['threads'])
+    if _worker.get('pooled') and type(estimator).__module__.startswith('catboost'):
+        # Concurrent fits would all write to the same catboost_info/ directory
+        estimator.set_params(allow_writing_files=False)
+    start = time.perf_counter()
+    estimator.fit(_worker['X'], _worker['y'][:, target])
+    seconds = time.perf_counter() - start
+    # The saved artifact keeps the thread setting it was configured with
+    restore_threads(estimator, saved)
+    return name, target, estimator, seconds, os.getpid()
+
+
+def assemble(base_estimator, estimators):
+    """A fitted MultiOutputRegressor from one fitted estimator per target."""
+    from sklearn.multioutput import MultiOutputRegressor
+
+    model = MultiOutputRegressor(base_estimator)
+    model.estimators_ = list(estimators)
+    if hasattr(estimators[0], 'n_features_in_'):
+        model.n_features_in_ = estimators[0].n_features_in_
+    if hasattr(estimators[0], 'feature_names_in_'):
+        model.feature_names_in_ = estimators[0].feature_names_in_
+    return model
+
+
+def train(estimators, X, y, cpus=None, workers=None):
+    """
+    Fit every estimator in {name: unfitted single-target estimator} on every column of y.
+    Returns:
+        dict with 'models' ({name: fitted MultiOutputRegressor}), 'fits' (one timing record
+        per model x target), 'wall_seconds', 'cpu_budget', 'workers' and 'threads_per_fit'
+    """
+    targets = list(getattr(y, 'columns', range(np.shape(y)[1])))
+    y = np.asarray(y)
+    tasks = [(name, j, estimator) for name, estimator in estimators.items() for j in range(y.shape[1])]
+    budget = cpu_budget(cpus)
+    n_workers, threads = split_budget(budget, len(tasks), workers)
+
+    start = time.perf_counter()
+    if n_workers == 1:
+        _worker.update(X=X, y=y, threads=threads, pooled=False)
+        try:
+            done = [_fit_one(task) for task in tasks]
+        finally:
+            _worker.clear()
+    else:
+        # spawn, not fork: forking after XGBoost/LightGBM have started OpenMP can deadlock
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(X, y, threads)) as pool:
+            done = list(pool.map(_fit_one, tasks))
+    wall = time.perf_counter() - start
+
+    fitted = {name: [None] * y.shape[1] for name in estimators}
+    fits = []
+    for name, target, estimator, seconds, pid in done:
+        fitted[name][target] = estimator
+        fits.append({'Model': name, 'Target': targets[target], 'Fit_seconds': seconds,
+                     'Threads': threads, 'Worker': pid})
+    return {
+        'models': {name: assemble(estimators[name], parts) for name, parts in fitted.items()},
+        'fits': fits,
+        'wall_seconds': wall,
+        'cpu_budget': budget,
+        'workers': n_workers,
+        'threads_per_fit': threads,
+    }
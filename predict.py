@@ -1,47 +1,221 @@
-import joblib
-import pandas as pd
+import hashlib
+import json
 import numpy as np
+import os
+import threading
+import time
+import metrics
+from feature_schema import FeatureSchema, model_feature_names
+from prediction_cache import PredictionCache
 
-# Load the trained model
-MODEL_PATH = 'models/best_model_Advanced.joblib'
-model = joblib.load(MODEL_PATH)
+# NUTRICARE_MODEL_PATH serves a different artifact, e.g. models/best_model_MultiTarget.joblib,
+# or a .npz compiled by tree_compiler.py, which is scored with NumPy alone
+MODEL_PATH = os.environ.get('NUTRICARE_MODEL_PATH', 'models/best_model_Advanced.joblib')
+LOOKUP_TABLE_PATH = 'models/lookup_table'
+# Compiled student distilled from the model by distill.py
+STUDENT_PATH = os.environ.get('NUTRICARE_STUDENT_PATH', 'models/student_model.npz')
+# Memory-mapped compiled copy of MODEL_PATH that 'shared' mode serves
+SHARED_PATH = os.environ.get('NUTRICARE_SHARED_PATH', os.path.splitext(MODEL_PATH)[0] + '.mmap')
+# 'model' scores with the trained model; 'lookup' answers from the precomputed grid built by
+# lookup_table.py and only loads the model for inputs outside the grid; 'student' serves the
+# small distilled model, trading a little accuracy for latency; 'shared' serves MODEL_PATH
+# compiled into a read-only memory-mapped file that all server workers share; 'registry'
+# serves the version named by model_registry's CURRENT pointer, which the API hot-swaps
+# when it changes
+SERVING_MODE = os.environ.get('NUTRICARE_SERVING_MODE', 'model')
+
+def file_checksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_model(path):
+    """Load a joblib model, or a compiled .npz tree ensemble without importing any ML library."""
+    if path.endswith('.npz'):
+        import compiled_model
+        return compiled_model.load(path)
+    if path.endswith('.mmap'):
+        import compiled_model
+        return compiled_model.load_mapped(path)
+    # joblib (and through the pickle, pandas/sklearn/catboost) is only imported on first load
+    import joblib
+    return joblib.load(path)
+
+class ServingModel:
+    """
+    A loaded model together with its feature schema and version, replaced as a unit.
+    The version is part of every cache key, so predictions from a different model never collide.
+    """
+
+    def __init__(self, model, version):
+        self.model = model
+        self.version = version
+        # Column layout resolved once at load time instead of on every prediction
+        self.schema = FeatureSchema.from_model(model)
+
+    def predict(self, X):
+        if not metrics.ENABLED:
+            return self.model.predict(X)
+        start = time.perf_counter()
+        prediction = self.model.predict(X)
+        metrics.model_predict_seconds.observe(time.perf_counter() - start)
+        metrics.model_predict_rows.observe(len(X))
+        return prediction
+
+def load_registry_model(version=None):
+    """Load a registered version (default: the current one), verifying its checksum."""
+    import model_registry
+    version = version or model_registry.current_version()
+    if version is None:
+        raise ValueError(f"No model has been promoted in {model_registry.REGISTRY_DIR}")
+    path = model_registry.artifact_path(version)
+    if file_checksum(path) != model_registry.read_metadata(version)['checksum']:
+        raise ValueError(f"Checksum mismatch for registered model {version}")
+    return ServingModel(load_model(path), version)
+
+def build_shared_weights(source=MODEL_PATH, path=SHARED_PATH):
+    """
+    Compile source into the memory-mapped file path unless it is already compiled from this
+    exact source. Returns the source checksum. Run once before starting the workers (the
+    first worker to start does it otherwise); the file is replaced atomically.
+    """
+    import compiled_model
+    checksum = file_checksum(source)
+    try:
+        if compiled_model.mapped_header(path).get('source_checksum') == checksum:
+            return checksum
+    except (FileNotFoundError, ValueError):
+        pass
+    if source.endswith('.npz'):
+        compiled = compiled_model.load(source)
+    else:
+        import joblib
+        from tree_compiler import check_parity, compile_model, probe_matrix
+        model = joblib.load(source)
+        try:
+            compiled = compile_model(model)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{source} cannot be served in shared mode: {e}") from e
+        max_diff = check_parity(model, compiled, probe_matrix(compiled))
+        if max_diff > 1e-3:
+            raise ValueError(f"Compiled {source} deviates from the original by {max_diff:.2e}")
+    tmp = f'{path}.tmp-{os.getpid()}'
+    compiled.save_mapped(tmp, source_checksum=checksum)
+    os.replace(tmp, path)
+    return checksum
+
+def build_lookup_table(source=MODEL_PATH, path=LOOKUP_TABLE_PATH):
+    """
+    Rebuild the lookup table from source, on the grid it already uses, unless it was built
+    from this exact file. Otherwise grid rows would be answered by a stale model and other
+    rows by source. Returns the source checksum.
+    """
+    import lookup_table
+    checksum = file_checksum(source)
+    try:
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        metadata = {}
+    if metadata.get('model_version') == checksum[:12]:
+        return checksum
+    grid = {}
+    if 'n_bmi' in metadata:
+        grid = {'age_min': metadata['age_min'], 'age_max': metadata['age_max'], 'bmi_min': metadata['bmi_min'],
+                'bmi_max': metadata['bmi_min'] + metadata['bmi_step'] * (metadata['n_bmi'] - 1),
+                'bmi_step': metadata['bmi_step']}
+    model = load_model(source)
+    table, metadata = lookup_table.build(model, model_feature_names(model), **grid)
+    metadata.update(model_path=source, model_version=checksum[:12])
+    lookup_table.save(table, metadata, path)
+    return checksum
+
+def load_serving_model():
+    """Load the model selected by NUTRICARE_SERVING_MODE / NUTRICARE_MODEL_PATH / NUTRICARE_STUDENT_PATH."""
+    if SERVING_MODE == 'registry':
+        return load_registry_model()
+    if SERVING_MODE == 'lookup':
+        from lookup_table import LookupTable
+        build_lookup_table()
+        model = LookupTable.load(LOOKUP_TABLE_PATH, fallback=lambda: load_model(MODEL_PATH))
+        return ServingModel(model, 'lookup-' + model.metadata['model_version'])
+    if SERVING_MODE == 'student':
+        return ServingModel(load_model(STUDENT_PATH), 'student-' + file_checksum(STUDENT_PATH)[:12])
+    if SERVING_MODE == 'shared':
+        checksum = build_shared_weights()
+        return ServingModel(load_model(SHARED_PATH), 'shared-' + checksum[:12])
+    if SERVING_MODE == 'model':
+        return ServingModel(load_model(MODEL_PATH), file_checksum(MODEL_PATH)[:12])
+    raise ValueError(f"Unknown NUTRICARE_SERVING_MODE '{SERVING_MODE}' "
+                     "(expected 'model', 'lookup', 'student', 'shared' or 'registry')")
+
+# Nothing heavy happens at import time: the model is loaded on first use (or ahead of time by
+# the API's background loader), so importing this module stays cheap.
+_current = None
+_load_lock = threading.Lock()
+
+def get_serving_model():
+    """Return the loaded ServingModel, loading it on first call (thread-safe)."""
+    global _current
+    if _current is None:
+        with _load_lock:
+            if _current is None:
+                _current = load_serving_model()
+    return _current
+
+def is_loaded():
+    return _current is not None
+
+def set_serving_model(serving_model):
+    """
+    Replace the served model. Callers that already hold the previous ServingModel finish
+    with it; every later get_serving_model() call sees the new one.
+    """
+    global _current
+    with _load_lock:
+        _current = serving_model
+
+# Repeated feature vectors (goal presets, one-hots, integer ages) are served from memory.
+# NUTRICARE_CACHE_SIZE=0 disables the cache; NUTRICARE_CACHE_TTL is in seconds.
+# NUTRICARE_CACHE_DECIMALS coarsens the cache key only; rows are always scored unrounded.
+cache = PredictionCache(
+    maxsize=int(os.environ.get('NUTRICARE_CACHE_SIZE', '4096')),
+    ttl=float(os.environ['NUTRICARE_CACHE_TTL']) if os.environ.get('NUTRICARE_CACHE_TTL') else None,
+    decimals=int(os.environ['NUTRICARE_CACHE_DECIMALS']) if os.environ.get('NUTRICARE_CACHE_DECIMALS') else None,
+)
+
+def derive_calories(protein, carbs, fat):
+    """Nutrition science standard: 4 kcal/g for protein and carbs, 9 kcal/g for fat."""
+    return (protein * 4) + (carbs * 4) + (fat * 9)
 
 def predict_nutrition(input_dict):
     """
-    Accepts a dictionary of feature values, converts to DataFrame, predicts macros and derives calories.
-    Adds any missing features (with value 0) expected by the model.
+    Accepts a dictionary of feature values, vectorizes it with the model's feature schema,
+    predicts macros and derives calories. Features not supplied default to 0.
     Args:
         input_dict (dict): Feature values for prediction.
     Returns:
-        dict: Prediction results with calories derived from macros.
-    """
-    df = pd.DataFrame([input_dict])
-    # Get expected feature names from the model (CatBoost stores them in feature_names_)
-    expected_features = None
-    if hasattr(model, 'feature_names_'):
-        expected_features = list(model.feature_names_)
-    elif hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'feature_names_'):
-        expected_features = list(model.estimators_[0].feature_names_)
-    if expected_features is not None:
-        for col in expected_features:
-            if col not in df.columns:
-                df[col] = 0
-        df = df[expected_features]
-    # Ensure all columns are numeric (optional, for safety)
-    df = df.apply(pd.to_numeric, errors='coerce').fillna(0)
-    
+        dict: Prediction results with calories derived from macros, and the model version.
+    Raises:
+        ValueError: If input_dict has unknown keys or non-numeric values.
+    """
+    current = get_serving_model()
+    row = current.schema.vectorize(input_dict)
+
     # Predict only macros (protein, carbs, fat)
-    prediction = model.predict(df)[0]  # Get first (and only) row
-    protein, carbs, fat = prediction
-    
-    # Derive calories using nutrition science standard: 4 kcal/g for protein and carbs, 9 kcal/g for fat
-    calories = (protein * 4) + (carbs * 4) + (fat * 9)
-    
+    prediction = cache.get_or_compute(
+        cache.key(row, current.version),
+        lambda: current.predict(row[np.newaxis, :])[0]  # Get first (and only) row
+    )
+    protein, carbs, fat = (float(v) for v in prediction)
+
+    calories = derive_calories(protein, carbs, fat)
+
     return {
         'calories': calories,
         'protein': protein,
         'carbs': carbs,
-        'fat': fat
+        'fat': fat,
+        'model_version': current.version
     }
 
 def predict_calories(input_dict):
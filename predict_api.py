@@ -1,32 +1,445 @@
-from fastapi import FastAPI, Request
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import joblib
-import pandas as pd
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import csv
+import io
+import json
+import logging
+import numpy as np
+import os
+import time
+import metrics
+from batching import MicroBatcher
+from csv_stream import CSVChunker, MultipartFile
+from nutrient_tags import tag_prediction, tag_predictions
+from predict import SERVING_MODE, cache, derive_calories, get_serving_model, load_registry_model, set_serving_model
+from score_bulk import frame_columns, plan_columns, predict_chunk, read_options
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Concurrent /predict calls are coalesced into batches of up to MAX_BATCH_SIZE rows,
+# waiting at most MAX_WAIT_MS for stragglers after the first row arrives
+# Each request passes the predict of the model whose schema built its row, so a model swap
+# never scores a row against the wrong column layout
+batcher = MicroBatcher(
+    lambda X: get_serving_model().predict(X),
+    max_batch_size=int(os.environ.get("NUTRICARE_MAX_BATCH_SIZE", "64")),
+    max_wait_ms=float(os.environ.get("NUTRICARE_MAX_WAIT_MS", "2")),
+)
+
+# Sent through the full scoring path once before /readyz reports ready
+WARMUP_PROFILE = {"Age": 30, "BMI": 24.5, "Carb_ratio": 0.40, "Protein_ratio": 0.30, "Fat_ratio": 0.30}
+
+# In registry mode, how often the registry's CURRENT pointer is checked for a new version
+REGISTRY_POLL_SECONDS = float(os.environ.get("NUTRICARE_REGISTRY_POLL_SECONDS", "5"))
+
+# Progress of the background model load: starting -> loading -> ready | failed
+readiness = {"status": "starting", "error": None, "load_seconds": None, "warmup_seconds": None,
+             "model_version": None, "reloads": 0, "reload_error": None}
+
+def warm_up(current):
+    row = current.schema.vectorize(WARMUP_PROFILE)
+    # Warm both the single-row and the batched code paths
+    current.predict(row[np.newaxis, :])
+    current.predict(np.repeat(row[np.newaxis, :], 8, axis=0))
+
+def load_and_warm_up():
+    start = time.perf_counter()
+    current = get_serving_model()
+    loaded = time.perf_counter()
+    warm_up(current)
+    readiness["load_seconds"] = loaded - start
+    readiness["warmup_seconds"] = time.perf_counter() - loaded
+    readiness["model_version"] = current.version
+
+async def load_in_background():
+    readiness["status"] = "loading"
+    try:
+        await run_in_threadpool(load_and_warm_up)
+    except Exception as e:
+        logger.exception("Model failed to load")
+        readiness.update(status="failed", error=repr(e))
+        return
+    readiness["status"] = "ready"
+    logger.info("Model %s loaded in %.2fs, warmed up in %.3fs", readiness["model_version"],
+                readiness["load_seconds"], readiness["warmup_seconds"])
+
+def load_version(version):
+    new = load_registry_model(version)
+    warm_up(new)
+    return new
+
+async def watch_registry():
+    """
+    Poll the registry pointer and hot-swap to the version it names. The new version is loaded
+    and warmed up off the event loop while the old one keeps serving; requests that already
+    hold the old model finish on it. A version that fails to load is not retried until the
+    pointer changes again. If the startup load failed (e.g. nothing was promoted yet), every
+    poll tries to load the current version until one succeeds and the API turns ready.
+    """
+    import model_registry
+    failed = None
+    while True:
+        await asyncio.sleep(REGISTRY_POLL_SECONDS)
+        if readiness["status"] in ("starting", "loading"):
+            continue
+        ready = readiness["status"] == "ready"
+        try:
+            version = model_registry.current_version()
+        except Exception as e:
+            logger.warning("Cannot read the model registry pointer: %r", e)
+            continue
+        if version is None or (ready and version in (get_serving_model().version, failed)):
+            continue
+        try:
+            new = await run_in_threadpool(load_version, version)
+        except Exception as e:
+            if version != failed:
+                if ready:
+                    logger.exception("Model %s failed to load; still serving %s", version, get_serving_model().version)
+                else:
+                    logger.exception("Model %s failed to load; not ready yet", version)
+            failed = version
+            if ready:
+                readiness["reload_error"] = f"{version}: {e!r}"
+            else:
+                readiness["error"] = repr(e)
+            continue
+        set_serving_model(new)
+        failed = None
+        if ready:
+            readiness.update(model_version=new.version, reloads=readiness["reloads"] + 1, reload_error=None)
+        else:
+            readiness.update(status="ready", error=None, model_version=new.version)
+        logger.info("Now serving model %s", new.version)
+
+@asynccontextmanager
+async def lifespan(app):
+    # The model loads in the background so the server binds its port immediately;
+    # /readyz turns 200 once it is loaded and warmed up
+    await batcher.start()
+    tasks = [asyncio.create_task(load_in_background())]
+    if SERVING_MODE == "registry":
+        tasks.append(asyncio.create_task(watch_registry()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await batcher.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
-model = joblib.load("models/best_model_Advanced.joblib")
+def serving_model():
+    """The loaded model, or a 503 while it is still loading."""
+    if readiness["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"model is {readiness['status']}")
+    return get_serving_model()
+
+# Clients opt in to per-stage timings of their own request by sending this header;
+# they come back in a Server-Timing response header (milliseconds)
+TIMING_HEADER = "X-NutriCare-Timing"
+
+def finish(route, timer, request, response):
+    metrics.record(route, timer)
+    if TIMING_HEADER in request.headers:
+        response.headers["Server-Timing"] = timer.server_timing()
+
+def to_result(prediction, model_version, nutrient_tag=None):
+    protein, carbs, fat = (float(v) for v in prediction)
+    calories = derive_calories(protein, carbs, fat)
+    if nutrient_tag is None:
+        nutrient_tag = tag_prediction(protein, carbs, fat)
+    return {"protein": protein, "carbs": carbs, "fat": fat, "calories": calories,
+            "nutrient_tag": nutrient_tag, "model_version": model_version}
+
+async def read_json(request):
+    """The parsed JSON request body; 400 if it is empty or not valid JSON."""
+    try:
+        return await request.json()
+    except ValueError as e:
+        # json.JSONDecodeError and UnicodeDecodeError are both ValueErrors
+        raise HTTPException(status_code=400, detail=f"request body is not valid JSON: {e}")
 
 @app.post("/predict")
-async def predict(request: Request):
-    data = await request.json()
-    df = pd.DataFrame([data])
-
-    # Ensure columns match model expectations
-    expected_features = None
-    if hasattr(model, 'feature_names_'):
-        expected_features = list(model.feature_names_)
-    elif hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'feature_names_'):
-        expected_features = list(model.estimators_[0].feature_names_)
-
-    if expected_features is not None:
-        for col in expected_features:
-            if col not in df.columns:
-                df[col] = 0
-        df = df[expected_features]
-
-    prediction = model.predict(df)[0]
-    protein, carbs, fat = prediction
-    calories = protein*4 + carbs*4 + fat*9
-    return {"protein": protein, "carbs": carbs, "fat": fat, "calories": calories}
+async def predict(request: Request, response: Response):
+    current = serving_model()
+    timer = metrics.StageTimer()
+    data = await read_json(request)
+    timer.mark("parse")
+    try:
+        row = current.schema.vectorize(data)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    timer.mark("vectorize")
+    # Cache lookup, micro-batch queue wait and model.predict
+    prediction = await cache.get_or_compute_async(cache.key(row, current.version), lambda: batcher.submit(row, current.predict))
+    timer.mark("predict")
+    result = to_result(prediction, current.version)
+    timer.mark("derive")
+    finish("/predict", timer, request, response)
+    return result
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, response: Response):
+    """
+    Score a JSON array of profiles with a single model.predict call.
+    Invalid profiles are reported per row and do not fail the rest of the batch.
+    """
+    current = serving_model()
+    schema = current.schema
+    timer = metrics.StageTimer()
+    data = await read_json(request)
+    timer.mark("parse")
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail="request body must be a JSON array of profiles")
+    metrics.batch_rows.observe(len(data))
+
+    # Valid rows are packed densely into one preallocated matrix
+    X = np.zeros((len(data), schema.n_features), dtype=np.float32)
+    results = [None] * len(data)
+    errors = []
+    valid_index = []
+    for i, profile in enumerate(data):
+        row = X[len(valid_index)]
+        try:
+            schema.fill(row, profile)
+        except ValueError as e:
+            row[:] = 0
+            errors.append({"index": i, "error": str(e)})
+            continue
+        valid_index.append(i)
+    timer.mark("vectorize")
+
+    if valid_index:
+        predictions = await run_in_threadpool(current.predict, X[:len(valid_index)])
+        timer.mark("predict")
+        tags = tag_predictions(predictions)
+        for i, prediction, tag in zip(valid_index, predictions, tags):
+            results[i] = to_result(prediction, current.version, tag)
+        timer.mark("derive")
+
+    finish("/predict/batch", timer, request, response)
+    return {"results": results, "errors": errors, "model_version": current.version}
+
+# Column order of the float32 rows /predict/binary returns
+BINARY_OUTPUTS = ("protein", "carbs", "fat", "calories")
+
+@app.get("/schema")
+async def schema():
+    """The served feature layout: what /predict/binary rows must contain, in order."""
+    current = serving_model()
+    return {"columns": list(current.schema.columns), "digest": current.schema.digest, "dtype": "<f4",
+            "outputs": list(BINARY_OUTPUTS), "model_version": current.version}
+
+@app.post("/predict/binary")
+async def predict_binary(request: Request):
+    """
+    Score a raw little-endian float32 row-major matrix (Content-Type application/octet-stream).
+    The request names its layout with X-Schema-Digest (the digest from /schema) or
+    X-Columns (comma-separated column names); a layout that does not match the served
+    model is rejected with 409 before the body is read. Returns a float32 row-major matrix
+    of BINARY_OUTPUTS, one row per input row, with X-Model-Version.
+    """
+    current = serving_model()
+    schema = current.schema
+    timer = metrics.StageTimer()
+    digest = request.headers.get("x-schema-digest")
+    columns = request.headers.get("x-columns")
+    order = None
+    if digest is not None:
+        if digest != schema.digest:
+            raise HTTPException(status_code=409, detail=f"schema digest {digest} does not match the served "
+                                                        f"model's {schema.digest}; fetch /schema")
+    elif columns is not None:
+        names = [c.strip() for c in columns.split(",")]
+        if sorted(names) != sorted(schema.columns):
+            raise HTTPException(status_code=409, detail=f"X-Columns must name exactly the columns {list(schema.columns)}")
+        if tuple(names) != schema.columns:
+            # Same columns in another order: gather them into the model's order (one copy)
+            order = [names.index(c) for c in schema.columns]
+    else:
+        raise HTTPException(status_code=428, detail="send X-Schema-Digest or X-Columns to name the row layout")
+
+    body = await request.body()
+    if len(body) % (4 * schema.n_features):
+        raise HTTPException(status_code=400, detail=f"body is not a whole number of {schema.n_features}-column float32 rows")
+    # A read-only view over the request bytes: no parsing, no copy
+    X = np.frombuffer(body, dtype="<f4").reshape(-1, schema.n_features)
+    if order is not None:
+        X = X[:, order]
+    if not np.isfinite(X).all():
+        raise HTTPException(status_code=422, detail="features must be finite numbers")
+    timer.mark("parse")
+
+    out = np.empty((len(X), len(BINARY_OUTPUTS)), dtype="<f4")
+    if len(X):
+        out[:, :3] = await run_in_threadpool(current.predict, X)
+        timer.mark("predict")
+        out[:, 3] = derive_calories(out[:, 0], out[:, 1], out[:, 2])
+    timer.mark("derive")
+    result = Response(out.tobytes(), media_type="application/octet-stream",
+                      headers={"X-Model-Version": current.version, "X-Outputs": ",".join(BINARY_OUTPUTS)})
+    finish("/predict/binary", timer, request, result)
+    return result
+
+# CSV uploads are parsed and scored in blocks of about this many bytes (~7,000 rows of the dataset)
+UPLOAD_CHUNK_BYTES = int(os.environ.get("NUTRICARE_UPLOAD_CHUNK_BYTES", str(1 << 20)))
+
+class UploadResponse(StreamingResponse):
+    """
+    A StreamingResponse whose body generator is still reading the request body. Starlette's
+    StreamingResponse listens on receive() for a disconnect while it streams, which would
+    swallow the upload's remaining body messages, so the generator is left to read them
+    (request.stream() raises ClientDisconnect if the client goes away).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def read_upload_block(plan, header, block):
+    """
+    (DataFrame, row number in the block of each of its rows, {row: error}) for one block of
+    whole CSV rows. If pandas cannot parse the block (e.g. a row with too many fields), the
+    rows are split with the csv module, malformed ones are reported and the rest re-parsed.
+    """
+    import pandas as pd
+    try:
+        df = pd.read_csv(io.BytesIO(header + block), **read_options(plan))
+        return df, np.arange(len(df)), {}
+    except ValueError:
+        pass
+    names = next(csv.reader([header.decode("utf-8-sig", errors="replace")]))
+    good = io.StringIO()
+    writer = csv.writer(good)
+    writer.writerow(names)
+    positions, errors = [], {}
+    # Blank lines are skipped, as pandas does
+    records = [r for r in csv.reader(io.StringIO(block.decode("utf-8", errors="replace"))) if r]
+    for i, record in enumerate(records):
+        if len(record) != len(names):
+            errors[i] = f"expected {len(names)} fields, found {len(record)}"
+            continue
+        writer.writerow(record)
+        positions.append(i)
+    df = pd.read_csv(io.StringIO(good.getvalue()), **read_options(plan))
+    return df, np.array(positions, dtype=np.int64), errors
+
+def score_upload_block(current, plan, header, block, first_row):
+    """(NDJSON lines, rows in the block, rows that failed) for one block of whole CSV rows."""
+    lines = ""
+    try:
+        df, positions, errors = read_upload_block(plan, header, block)
+        rows = len(df) + len(errors)
+        if len(df):
+            out, value_errors = predict_chunk(current, plan, frame_columns(df, plan))
+            errors.update({int(positions[r]): error for r, error in value_errors.items()})
+            out.insert(0, "row", first_row + positions[out.index])
+            if len(out):
+                lines = out.to_json(orient="records", lines=True)
+    except (ValueError, csv.Error) as e:
+        # The block could not be split into rows at all: it is reported as a whole
+        rows = block.count(b"\n") + (not block.endswith(b"\n"))
+        return json.dumps({"error": str(e), "first_row": first_row, "rows": rows}) + "\n", rows, rows
+    lines += "".join(json.dumps({"row": first_row + r, "error": errors[r]}) + "\n" for r in sorted(errors))
+    return lines, rows, len(errors)
+
+@app.post("/predict/upload")
+async def predict_upload(request: Request):
+    """
+    Score a patient CSV while it uploads, as a multipart file field or a raw text/csv body.
+    Whole rows are cut into blocks as the body arrives and scored on a worker thread, and
+    results stream back as NDJSON: one object per row ("row" is its 0-based index), a
+    {"row", "error"} object for each row that could not be scored (after the block's
+    results), and a final {"done", "rows", "errors", "model_version"} summary, "errors"
+    counting failed rows. Only one block is held at a time.
+    """
+    current = serving_model()
+    content_type = request.headers.get("content-type", "")
+    try:
+        upload = MultipartFile(content_type) if content_type.startswith("multipart/form-data") else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunker = CSVChunker(UPLOAD_CHUNK_BYTES)
+    body = request.stream()
+
+    # Read up to the header row before answering, so a file the model cannot score is a 422
+    blocks, ended = [], True
+    async for data in body:
+        blocks += chunker.feed(upload.feed(data) if upload else data)
+        if chunker.header is not None:
+            ended = False
+            break
+    if ended:
+        blocks += chunker.close()
+    if chunker.header is None:
+        raise HTTPException(status_code=400, detail="empty upload")
+    header = next(csv.reader([chunker.header.decode("utf-8-sig")]))
+    try:
+        plan = plan_columns(header, current.schema, "Patient_ID" if "Patient_ID" in header else None)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def row_blocks():
+        for block in blocks:
+            yield block
+        if not ended:
+            async for data in body:
+                for block in chunker.feed(upload.feed(data) if upload else data):
+                    yield block
+            for block in chunker.close():
+                yield block
+
+    async def results():
+        rows = errors = 0
+        async for block in row_blocks():
+            lines, n, failed = await run_in_threadpool(score_upload_block, current, plan, chunker.header, block, rows)
+            rows += n
+            errors += failed
+            yield lines
+        yield json.dumps({"done": True, "rows": rows, "errors": errors, "model_version": current.version}) + "\n"
+
+    return UploadResponse(results(), media_type="application/x-ndjson",
+                             headers={"X-Model-Version": current.version})
+
+@app.get("/stats/batching")
+async def batching_stats():
+    """Queue depth and batch-size stats for tuning max batch size / max wait."""
+    return batcher.stats()
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Hit/miss counters of the prediction cache in front of /predict."""
+    return cache.stats()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving HTTP, whether or not the model has loaded."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model is loaded and warmed up, 503 before that or if loading failed."""
+    return JSONResponse(readiness, status_code=200 if readiness["status"] == "ready" else 503)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request, stage and model latency histograms plus cache and batcher counters, in Prometheus text format."""
+    cache_stats, batch_stats = cache.stats(), batcher.stats()
+    extra = (
+        metrics.sample("nutricare_cache_hits_total", "Prediction cache hits", "counter", cache_stats["hits"])
+        + metrics.sample("nutricare_cache_misses_total", "Prediction cache misses", "counter", cache_stats["misses"])
+        + metrics.sample("nutricare_cache_size", "Entries in the prediction cache", "gauge", cache_stats["size"])
+        + metrics.sample("nutricare_batcher_queue_depth", "Rows waiting for a micro-batch", "gauge", batch_stats["queue_depth"])
+        + metrics.sample("nutricare_batcher_errors_total", "Micro-batched rows whose model call failed", "counter", batch_stats["errors"])
+        + metrics.sample("nutricare_model_info", "Served model version", "gauge", 1,
+                         f'{{version="{readiness["model_version"]}",status="{readiness["status"]}"}}')
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+# Added last so it sees every route and wraps the whole app, CORS included
+app.add_middleware(metrics.MetricsMiddleware, routes=[route.path for route in app.routes])
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of model outputs keyed on the feature row and model version.
+
+    Serving inputs are nearly discrete (goal presets, one-hots, integer ages), so the same
+    vectors repeat constantly. By default the key is the exact float32 row, so a cached value
+    is exactly what the model returns for it. With `decimals` set, rows that agree to that many
+    places share a key (more hits); the row that is scored is never rounded, so a hit may
+    return the prediction of a neighbouring row. Entries expire after `ttl` seconds if set.
+    Concurrent misses for the same key share a single computation (sync and async callers alike).
+    A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=4096, ttl=None, decimals=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def quantize(self, row):
+        if self.decimals is None:
+            return row
+        return np.round(row, self.decimals).astype(np.float32, copy=False)
+
+    def key(self, row, model_version):
+        """Key for a float32 row (rounded to `decimals` places when set)."""
+        return (model_version, self.quantize(row).tobytes())
+
+    def get(self, key):
+        """Return the cached value or None, counting the hit/miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() at most once across threads."""
+        if self.maxsize <= 0:
+            return compute()
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            waiter = self._inflight.get(key)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+        if not owner:
+            waiter[0].wait()
+            if waiter[2] is not None:
+                raise waiter[2]
+            return waiter[1]
+        try:
+            waiter[1] = compute()
+            self.put(key, waiter[1])
+            return waiter[1]
+        except Exception as e:
+            waiter[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            waiter[0].set()
+
+    async def get_or_compute_async(self, key, compute):
+        """Async variant of get_or_compute: compute is a coroutine function, awaited once per key."""
+        if self.maxsize <= 0:
+            return await compute()
+        value = self.get(key)
+        if value is not None:
+            return value
+        pending = self._inflight_async.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        pending = self._inflight_async[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+            self.put(key, value)
+            pending.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as never retrieved
+            pending.exception()
+            raise
+        finally:
+            del self._inflight_async[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
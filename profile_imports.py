@@ -0,0 +1,101 @@
+"""
+Import-time profile of the serving entry points, to track cold-start time of autoscaled replicas.
+
+Each module is imported in a fresh interpreter under `python -X importtime`. The report lists the
+wall time of the import, the slowest imports it makes directly, and whether any of the heavy
+ML libraries got imported eagerly. With --with-model it also times the first model load
+(predict.get_serving_model), which is what /readyz waits for.
+
+Usage:
+    python profile_imports.py [--top 10] [--with-model] [--json reports/import_profile.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = ['predict', 'interactive_predict', 'predict_api']
+HEAVY = ('pandas', 'sklearn', 'catboost', 'xgboost', 'lightgbm', 'joblib')
+
+MODEL_MARKER = '--- model load ---'
+PROBE = """
+import time
+start = time.perf_counter()
+import {module}
+print('import_seconds', time.perf_counter() - start)
+if {with_model}:
+    import sys
+    print({marker}, file=sys.stderr, flush=True)
+    from predict import get_serving_model
+    start = time.perf_counter()
+    get_serving_model()
+    print('model_load_seconds', time.perf_counter() - start)
+"""
+
+
+def parse_importtime(stderr):
+    """-X importtime output as a list of (package, nesting level, cumulative_us)."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # One leading space, then two more per nesting level
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), level, int(cumulative_us)))
+    return entries
+
+
+def profile(module, with_model=False):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, with_model=with_model, marker=repr(MODEL_MARKER))],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = dict(line.split() for line in result.stdout.splitlines() if line.endswith(tuple('0123456789')))
+    # Only count what importing the module pulled in, not what the model load imported later
+    imports = parse_importtime(result.stderr.split(MODEL_MARKER)[0])
+    # The module's direct imports show where its own import time goes
+    direct = [(name, cumulative_us) for name, level, cumulative_us in imports if level == 1]
+    report = {
+        'module': module,
+        'import_seconds': float(timings['import_seconds']),
+        'heavy_imports': sorted({name.split('.')[0] for name, _, _ in imports if name.split('.')[0] in HEAVY}),
+        'top_imports': sorted(direct, key=lambda item: item[1], reverse=True),
+    }
+    if 'model_load_seconds' in timings:
+        report['model_load_seconds'] = float(timings['model_load_seconds'])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile import (and model load) time of the serving modules.')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--top', type=int, default=10, help='slowest direct imports to show per module')
+    parser.add_argument('--with-model', action='store_true', help='also time the first model load')
+    parser.add_argument('--json', help='write the full report to this path')
+    args = parser.parse_args()
+
+    reports = []
+    for module in args.modules:
+        report = profile(module, args.with_model)
+        report['top_imports'] = report['top_imports'][:args.top]
+        reports.append(report)
+        print(f"\n{module}: import {report['import_seconds'] * 1000:.0f} ms", end='')
+        if 'model_load_seconds' in report:
+            print(f", model load {report['model_load_seconds'] * 1000:.0f} ms", end='')
+        print(f"\n  heavy ML imports at import time: {', '.join(report['heavy_imports']) or 'none'}")
+        for name, cumulative_us in report['top_imports']:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nImport profile saved to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
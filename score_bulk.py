@@ -0,0 +1,349 @@
+"""
+Bulk scoring: macro, calorie and nutrient tag predictions for every row of a dataset.
+
+The input is streamed in chunks of --chunksize rows: pd.read_csv chunks of a CSV, or with
+--columnar, slices of the memory-mapped data_store column cache. Only the columns the model
+needs are read. Every chunk goes through the serving FeatureSchema, so both raw datasets
+(Gender, Chronic_Disease and the Recommended_* grams the ratio features come from) and
+feature-level files (Gender_Male, Carb_ratio, ...) can be scored. Chunks are scored in a
+process pool whose workers each load the serving model once (NUTRICARE_SERVING_MODE and
+NUTRICARE_MODEL_PATH apply, as in the API), with at most two chunks per worker in flight,
+and the results are appended to the output in input order.
+
+Rows with a value the model cannot take (non-numeric, missing or infinite numbers, missing
+or unknown Gender / Chronic_Disease levels) are left out of the output and listed, with their 0-based
+input row number, id and reason, in <output name>_errors.csv; the rest of their chunk is scored
+as usual.
+
+After each chunk the outputs are flushed and <output>.progress.json records how many chunks
+and bytes are complete. --resume truncates both files to that point and carries on from
+the next chunk.
+
+Usage:
+    python score_bulk.py data/cleaned_nutricare.csv [-o predictions.csv] [--chunksize 100000]
+                         [--workers 4] [--columnar] [--resume]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from feature_schema import FLOAT32_MAX
+from features import BASE_FEATURES, CATEGORICAL, RATIO_SOURCES, macro_ratios
+
+OUTPUT_COLUMNS = ['protein', 'carbs', 'fat', 'calories', 'nutrient_tag']
+ERROR_COLUMNS = ['row', 'error']
+# 0.1 mg is far below the model's error, and shorter numbers format faster and take less disk
+DECIMALS = 4
+
+# State of a pool worker, set once by _init_worker
+_worker = {}
+
+
+def plan_columns(header, schema, id_column=None):
+    """Which input columns to read and how they map onto the model's features."""
+    features = [c for c in header if c in schema.index]
+    text = [c for c in CATEGORICAL if c in header and c not in schema.index]
+    ratios = [r for r in RATIO_SOURCES if r in schema.index and r not in header]
+    derive_ratios = bool(ratios) and all(source in header for source in RATIO_SOURCES.values())
+    available = set(features) | (set(ratios) if derive_ratios else set())
+    missing = [c for c in BASE_FEATURES if c in schema.index and c not in available]
+    if missing:
+        raise ValueError(f"Input has no column for features {missing}")
+    read = features + text + (list(RATIO_SOURCES.values()) if derive_ratios else [])
+    if id_column:
+        read.append(id_column)
+    return {'features': features + text, 'derive_ratios': derive_ratios, 'id': id_column,
+            'read': list(dict.fromkeys(read))}
+
+
+def clean_columns(data, plan, schema):
+    """
+    (columns, {row: error}) for one chunk: a copy of data in which every value that
+    vectorize_columns would reject is replaced by a neutral one (0, or the baseline level),
+    and the first problem found in each row that held one. Scoring the copy and dropping
+    those rows reports bad values per row instead of failing the whole chunk.
+    """
+    import pandas as pd
+
+    clean, errors = {}, {}
+    for name, values in data.items():
+        if name == plan['id']:
+            clean[name] = values
+            continue
+        if isinstance(values, tuple):
+            codes, categories = values
+            unknown = [k for k, level in enumerate(categories)
+                       if f'{name}_{level}' not in schema.index and f'{name}_{level}' not in schema.baseline_keys]
+            for row in np.flatnonzero(codes < 0):
+                errors.setdefault(int(row), f"'{name}' is missing")
+            for row in np.flatnonzero(np.isin(codes, unknown)):
+                errors.setdefault(int(row), f"unknown feature '{name}_{categories[codes[row]]}'")
+            # Drop the unknown levels and give their rows and the missing ones (code -1) the
+            # baseline level, or any known one; those rows are left out of the output anyway
+            known = np.setdiff1d(np.arange(len(categories)), unknown)
+            baseline = [k for k in known if f'{name}_{categories[k]}' in schema.baseline_keys]
+            neutral = baseline[0] if baseline else known[0] if len(known) else None
+            if neutral is None:
+                # Every row of the chunk is in errors
+                continue
+            remap = np.full(len(categories) + 1, np.searchsorted(known, neutral))
+            remap[known] = np.arange(len(known))
+            clean[name] = (remap[codes], categories[known])
+            continue
+        numbers = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+        # NaN (missing or unparseable) fails the comparison too
+        bad = ~(np.abs(numbers) <= FLOAT32_MAX)
+        for row in np.flatnonzero(bad):
+            errors.setdefault(int(row), f"'{name}' must be a finite number, got {values[row]!r}")
+        clean[name] = np.where(bad, 0.0, numbers)
+    return clean, errors
+
+
+def predict_chunk(current, plan, data):
+    """
+    (predictions, {row: error}) for one chunk of columns. predictions is a DataFrame of
+    [id,] OUTPUT_COLUMNS rounded to DECIMALS for the rows that could be scored, indexed by
+    their 0-based row number in the chunk; the other rows are in the errors.
+    """
+    import pandas as pd
+    from nutrient_tags import tag_predictions
+    from predict import derive_calories
+
+    data, errors = clean_columns(data, plan, current.schema)
+    columns = {name: data[name] for name in plan['features'] if name in data}
+    if plan['derive_ratios']:
+        columns.update(macro_ratios(data))
+    prediction = np.asarray(current.predict(current.schema.vectorize_columns(columns)), dtype=np.float64)
+    protein, carbs, fat = prediction.T
+    out = pd.DataFrame({'protein': protein, 'carbs': carbs, 'fat': fat,
+                        'calories': derive_calories(protein, carbs, fat),
+                        'nutrient_tag': tag_predictions(prediction)})
+    if plan['id']:
+        out.insert(0, plan['id'], data[plan['id']])
+    if errors:
+        out = out.drop(index=list(errors))
+    return out.round(DECIMALS), errors
+
+
+def score_chunk(current, plan, data, first_row):
+    """
+    (predictions CSV text, errors CSV text, scored rows, error rows, model version) for one
+    chunk of columns whose first row is input row first_row. Neither text has a header.
+    """
+    import pandas as pd
+
+    out, errors = predict_chunk(current, plan, data)
+    error_text = ''
+    if errors:
+        rows = np.array(sorted(errors))
+        failed = pd.DataFrame({'row': first_row + rows, 'error': [errors[r] for r in rows]})
+        if plan['id']:
+            failed.insert(1, plan['id'], np.asarray(data[plan['id']])[rows])
+        error_text = failed.to_csv(index=False, header=False)
+    return out.to_csv(index=False, header=False), error_text, len(out), len(errors), current.version
+
+
+def _init_worker(plan, threads):
+    from parallel_training import THREAD_ENV
+    from predict import load_serving_model
+
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    _worker.update(plan=plan, model=load_serving_model())
+
+
+def _score_in_worker(data, first_row):
+    return score_chunk(_worker['model'], _worker['plan'], data, first_row)
+
+
+def frame_columns(df, plan):
+    """{name: array} of a parsed chunk's planned columns; text columns as (codes, categories) pairs."""
+    import pandas as pd
+
+    data = {}
+    for name in plan['read']:
+        if name in CATEGORICAL:
+            codes, categories = pd.factorize(df[name])
+            data[name] = (codes, np.asarray(categories, dtype=str))
+        else:
+            data[name] = df[name].to_numpy()
+    return data
+
+
+def read_options(plan):
+    """pd.read_csv arguments that parse only the planned columns, text columns as strings."""
+    return {'usecols': plan['read'], 'dtype': {c: object for c in CATEGORICAL if c in plan['read']}}
+
+
+def csv_chunks(path, plan, chunksize, skip=0):
+    """Column dicts of chunksize rows; text columns as (codes, categories) pairs."""
+    import pandas as pd
+
+    reader = pd.read_csv(path, chunksize=chunksize, **read_options(plan))
+    for i, chunk in enumerate(reader):
+        # Skipped chunks (already scored before a resume) are parsed but not scored
+        if i < skip:
+            continue
+        yield frame_columns(chunk, plan)
+
+
+def columnar_chunks(path, plan, chunksize, skip=0):
+    """The same chunks sliced from the memory-mapped column cache of path."""
+    import data_store
+
+    columns = data_store.read_columns(path, plan['read'], mmap_mode='r')
+    rows = data_store.ensure(path)['rows']
+    for start in range(skip * chunksize, rows, chunksize):
+        stop = start + chunksize
+        data = {}
+        for name, values in columns.items():
+            if not isinstance(values, tuple):
+                data[name] = np.asarray(values[start:stop])
+                continue
+            codes, categories = np.asarray(values[0][start:stop]), values[1]
+            if name == plan['id']:
+                # Ids are copied to the output as text; missing ones stay empty
+                data[name] = np.where(codes >= 0, categories[np.maximum(codes, 0)], '')
+            else:
+                data[name] = (codes, categories)
+        yield data
+
+
+def read_header(path, columnar):
+    if columnar:
+        import data_store
+        return [c['name'] for c in data_store.ensure(path)['columns']]
+    import pandas as pd
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _save_progress(path, progress):
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _resume_point(progress_path, progress):
+    """Saved progress of an interrupted run, which must have used the same input, settings and model."""
+    try:
+        with open(progress_path) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None
+    changed = [key for key in ('input', 'input_size', 'input_mtime_ns', 'chunksize', 'columnar',
+                               'id_column', 'model_version') if saved.get(key) != progress[key]]
+    if changed:
+        raise SystemExit(f"Cannot resume: {', '.join(changed)} changed since the interrupted run; "
+                         "run again without --resume to start over")
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every row of a dataset with the serving model.')
+    parser.add_argument('input', help='CSV file (with --columnar, read through its data_store column cache)')
+    parser.add_argument('-o', '--output', help='output CSV (default: <input>_predictions.csv)')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='scoring processes (default: NUTRICARE_CPUS or all available CPUs)')
+    parser.add_argument('--columnar', action='store_true', help='read from the memory-mapped column cache')
+    parser.add_argument('--id-column', default=None,
+                        help='input column copied to the output (default: Patient_ID when present)')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run of the same command')
+    args = parser.parse_args()
+
+    from parallel_training import cpu_budget
+    from predict import load_serving_model
+
+    output = args.output or os.path.splitext(args.input)[0] + '_predictions.csv'
+    errors_path = os.path.splitext(output)[0] + '_errors.csv'
+    progress_path = output + '.progress.json'
+    header = read_header(args.input, args.columnar)
+    id_column = args.id_column or ('Patient_ID' if 'Patient_ID' in header else None)
+    # Loaded here for its schema and version (and to score with when there is one worker)
+    current = load_serving_model()
+    plan = plan_columns(header, current.schema, id_column)
+    budget = cpu_budget(args.workers)
+    stat = os.stat(args.input)
+    progress = {'input': os.path.abspath(args.input), 'input_size': stat.st_size,
+                'input_mtime_ns': stat.st_mtime_ns, 'chunksize': args.chunksize, 'columnar': args.columnar,
+                'id_column': id_column, 'model_version': current.version,
+                'chunks': 0, 'rows': 0, 'bytes': 0, 'errors': 0, 'error_bytes': 0, 'complete': False}
+
+    saved = _resume_point(progress_path, progress) if args.resume else None
+    if saved and saved['complete']:
+        print(f"{output} is already complete ({saved['rows']} rows)")
+        return
+    if saved and os.path.exists(output) and os.path.exists(errors_path):
+        progress.update(chunks=saved['chunks'], rows=saved['rows'], bytes=saved['bytes'],
+                        errors=saved['errors'], error_bytes=saved['error_bytes'])
+        out = open(output, 'r+b')
+        out.truncate(progress['bytes'])
+        out.seek(progress['bytes'])
+        failed = open(errors_path, 'r+b')
+        failed.truncate(progress['error_bytes'])
+        failed.seek(progress['error_bytes'])
+        print(f"Resuming after chunk {progress['chunks']} ({progress['rows']} rows already scored)")
+    else:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        id_header = [id_column] if id_column else []
+        out = open(output, 'wb')
+        out.write((','.join(id_header + OUTPUT_COLUMNS) + '\n').encode())
+        failed = open(errors_path, 'wb')
+        failed.write((','.join(ERROR_COLUMNS[:1] + id_header + ERROR_COLUMNS[1:]) + '\n').encode())
+    progress.update(bytes=out.tell(), error_bytes=failed.tell())
+    _save_progress(progress_path, progress)
+
+    def write(result):
+        text, error_text, rows, errors, version = result
+        if version != current.version:
+            raise RuntimeError(f"A worker scored with model {version}, expected {current.version}")
+        for f, content in ((out, text), (failed, error_text)):
+            f.write(content.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        progress.update(chunks=progress['chunks'] + 1, rows=progress['rows'] + rows, bytes=out.tell(),
+                        errors=progress['errors'] + errors, error_bytes=failed.tell())
+        _save_progress(progress_path, progress)
+
+    read = columnar_chunks if args.columnar else csv_chunks
+    chunks = read(args.input, plan, args.chunksize, skip=progress['chunks'])
+    # Input row number of each chunk's first row: every chunk but the last has chunksize rows
+    first_rows = itertools.count(progress['chunks'] * args.chunksize, args.chunksize)
+    start_rows, start_errors = progress['rows'], progress['errors']
+    start = time.perf_counter()
+    with out, failed:
+        if budget == 1:
+            for data, first_row in zip(chunks, first_rows):
+                write(score_chunk(current, plan, data, first_row))
+        else:
+            # spawn, not fork: the parent has already loaded the model and its thread pools
+            with ProcessPoolExecutor(max_workers=budget, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(plan, 1)) as pool:
+                pending = deque()
+                for data, first_row in zip(chunks, first_rows):
+                    pending.append(pool.submit(_score_in_worker, data, first_row))
+                    if len(pending) >= 2 * budget:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    progress['complete'] = True
+    _save_progress(progress_path, progress)
+
+    seconds = time.perf_counter() - start
+    scored = progress['rows'] - start_rows
+    print(f"Scored {scored} rows in {seconds:.1f}s ({scored / max(seconds, 1e-9):,.0f} rows/s, "
+          f"{budget} worker{'s' if budget > 1 else ''}, model {current.version})")
+    print(f"Predictions saved to {output}")
+    failures = progress['errors'] - start_errors
+    if failures:
+        print(f"{failures} rows could not be scored; see {errors_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Stacking with cached out-of-fold predictions.
+
+StackingRegressor refits every base model on every call: once on the full training set and
+once per cross-validation fold. `fit_stacks` does the same fits (so the result is the same
+stack) but runs each (base model, target) pair once, caches its out-of-fold predictions
+and full-data model under data/oof_cache/<data hash>/, and fits the meta-learner on the
+cached prediction matrix. Re-running the script, swapping the meta-learner, or adding a
+base model only fits what is not already cached. Uncached pairs, across all targets, run
+concurrently under the parallel_training CPU budget.
+"""
+import hashlib
+import os
+import time
+import joblib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT, 'data', 'oof_cache')
+
+
+class StackedModel:
+    """A fitted per-target stack: base models' predictions fed to a fitted final estimator."""
+
+    def __init__(self, base_models, final_estimator):
+        self.base_models = base_models
+        self.final_estimator = final_estimator
+
+    def transform(self, X):
+        return np.column_stack([model.predict(X) for _, model in self.base_models])
+
+    def predict(self, X):
+        return self.final_estimator.predict(self.transform(X))
+
+
+def data_key(X, y, cv):
+    """Cache directory name: a hash of the training data and the fold layout."""
+    digest = hashlib.sha256()
+    for part in (np.ascontiguousarray(X, dtype=np.float64), np.ascontiguousarray(y, dtype=np.float64)):
+        digest.update(part.tobytes())
+    digest.update(f'{np.shape(X)}|{list(getattr(y, "columns", []))}|kfold-{cv}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def model_key(estimator):
+    """Hash of an estimator's class and parameters, so changed settings are refitted."""
+    params = sorted((k, repr(v)) for k, v in estimator.get_params(deep=False).items())
+    text = f'{type(estimator).__module__}.{type(estimator).__name__}|{params}'
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def _fit_base(estimator, X, y, cv, threads, pooled):
+    """Out-of-fold predictions from cv fold fits, plus a model fitted on all of X."""
+    from sklearn.base import clone
+    from sklearn.model_selection import KFold
+    from parallel_training import restore_threads, set_threads
+
+    def fresh():
+        model = clone(estimator)
+        if pooled and type(model).__module__.startswith('catboost'):
+            # Concurrent fits would all write to the same catboost_info/ directory
+            model.set_params(allow_writing_files=False)
+        return model, set_threads(model, threads)
+
+    X_rows = X.iloc if hasattr(X, 'iloc') else X
+    start = time.perf_counter()
+    oof = np.empty(len(y))
+    # KFold without shuffling, as StackingRegressor(cv=5) uses for a regressor
+    for fit_index, val_index in KFold(cv).split(X):
+        model, _ = fresh()
+        model.fit(X_rows[fit_index], y[fit_index])
+        oof[val_index] = model.predict(X_rows[val_index])
+    model, saved = fresh()
+    model.fit(X, y)
+    restore_threads(model, saved)
+    return {'oof': oof, 'model': model, 'fit_seconds': time.perf_counter() - start}
+
+
+def _cached_fit(path, estimator, X, y, cv, threads, pooled):
+    if os.path.exists(path):
+        entry = joblib.load(path)
+        entry['cached'] = True
+        return entry
+    entry = _fit_base(estimator, X, y, cv, threads, pooled)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    joblib.dump(entry, tmp)
+    os.replace(tmp, path)
+    entry['cached'] = False
+    return entry
+
+
+def fit_stacks(base_models, final_estimator, X, y, cv=5, cpus=None, cache_dir=CACHE_DIR):
+    """
+    One stack per column of y from [(name, estimator), ...] base models.
+    Returns:
+        ({target: StackedModel}, fit records with Model, Target, Fit_seconds and Cached)
+    """
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+    from parallel_training import cpu_budget, split_budget
+
+    entry_dir = os.path.join(cache_dir, data_key(X, y, cv))
+    os.makedirs(entry_dir, exist_ok=True)
+    targets = list(y.columns)
+    tasks = [(name, estimator, target, os.path.join(entry_dir, f'{name}-{target}-{model_key(estimator)}.joblib'))
+             for target in targets for name, estimator in base_models]
+    pending = sum(not os.path.exists(path) for *_, path in tasks)
+    workers, threads = split_budget(cpu_budget(cpus), max(pending, 1))
+    entries = Parallel(n_jobs=workers)(
+        delayed(_cached_fit)(path, estimator, X, y[target].to_numpy(), cv, threads, workers > 1)
+        for name, estimator, target, path in tasks)
+
+    stacks, fits = {}, []
+    for target in targets:
+        parts = [(task, entry) for task, entry in zip(tasks, entries) if task[2] == target]
+        oof_matrix = np.column_stack([entry['oof'] for _, entry in parts])
+        final = clone(final_estimator).fit(oof_matrix, y[target].to_numpy())
+        stacks[target] = StackedModel([(task[0], entry['model']) for task, entry in parts], final)
+        fits.extend({'Model': task[0], 'Target': target, 'Fit_seconds': entry['fit_seconds'],
+                     'Cached': entry['cached']} for task, entry in parts)
+    return stacks, fits
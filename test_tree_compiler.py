@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import joblib
+from tree_compiler import check_parity, compile_model, probe_matrix
+
+TOLERANCE = 1e-3
+
+print("Loading model...")
+MODEL_PATH = 'models/best_model_Advanced.joblib'
+model = joblib.load(MODEL_PATH)
+print(f"Model loaded successfully: {type(model)}")
+
+print("Compiling model...")
+compiled = compile_model(model)
+print(f"Compiled ensembles: {len(compiled.ensembles)}")
+print(f"Compiled features: {compiled.feature_names_}")
+
+print("Building probe rows...")
+X = probe_matrix(compiled)
+print(f"Probe matrix shape: {X.shape}")
+
+print("Checking parity...")
+max_diff = check_parity(model, compiled, X)
+print(f"Max |diff|: {max_diff:.2e} g")
+
+assert max_diff <= TOLERANCE, f"compiled model deviates from {MODEL_PATH} by {max_diff:.2e} g"
+print("Parity OK")
@@ -0,0 +1,234 @@
+"""
+Compiles fitted tree ensembles into the flat array format served by compiled_model.py.
+
+Supports CatBoost (oblivious trees, including MultiRMSE), sklearn RandomForest/ExtraTrees/
+GradientBoosting/DecisionTree regressors, XGBoost gbtree regressors with an identity link
+(scalar or multi_output_tree leaves), and MultiOutputRegressor wrappers around any of them.
+Other estimator classes raise TypeError; unsupported settings of a supported class
+(categorical features, other objectives or boosters, a custom init) raise ValueError.
+
+After compiling, the CLI checks parity against the original model on probe rows built from
+the model's own split thresholds (values exactly on, just below and just above each split),
+which exercises every comparison edge case, and refuses to write the artifact if any
+prediction differs by more than --tolerance.
+
+With --mapped the artifact is written in compiled_model's memory-mapped format (.mmap)
+instead, which NUTRICARE_SERVING_MODE=shared serves to every worker from one shared copy.
+
+Usage:
+    python tree_compiler.py models/best_model_Advanced.joblib [-o models/best_model_Advanced.npz] [--mapped]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+import numpy as np
+from compiled_model import BinaryTrees, ObliviousTrees, CompiledModel
+from feature_schema import model_feature_names
+
+def _float32_floor(values):
+    """Largest float32 <= each value: x <= t (and x > t) decide identically for float32 x."""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+XGB_IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror'}
+
+
+def _catboost(est):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        est.save_model(path, format='json')
+        with open(path) as f:
+            dump = json.load(f)
+    flat_index = [feat['flat_feature_index'] for feat in dump['features_info'].get('float_features', [])]
+    if dump['features_info'].get('categorical_features'):
+        raise ValueError("CatBoost models with categorical features are not supported")
+    scale, bias = dump['scale_and_bias']
+    bias = np.asarray(bias, dtype=np.float64)
+    trees = dump['oblivious_trees']
+    depth = max(len(t['splits']) for t in trees)
+    n_out = len(bias)
+    split_feature = np.zeros((len(trees), depth), dtype=np.int32)
+    split_border = np.full((len(trees), depth), np.inf)
+    leaf_values = np.zeros((len(trees), 2 ** depth, n_out))
+    for i, tree in enumerate(trees):
+        for level, split in enumerate(tree['splits']):
+            if split['split_type'] != 'FloatFeature':
+                raise ValueError(f"CatBoost split type {split['split_type']} is not supported")
+            split_feature[i, level] = flat_index[split['float_feature_index']]
+            split_border[i, level] = split['border']
+        values = np.asarray(tree['leaf_values'], dtype=np.float64).reshape(-1, n_out)
+        leaf_values[i, :len(values)] = values
+    return ObliviousTrees(split_feature, _float32_floor(split_border), leaf_values, scale, bias)
+
+
+def _sklearn_trees(trees, scale, bias):
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for est in trees:
+        t = est.tree_
+        leaf = t.children_left < 0
+        own = np.arange(t.node_count) + offset
+        roots.append(offset)
+        feature.append(np.where(leaf, -1, t.feature))
+        threshold.append(t.threshold)
+        left.append(np.where(leaf, own, t.children_left + offset))
+        right.append(np.where(leaf, own, t.children_right + offset))
+        value.append(t.value[:, :, 0])
+        offset += t.node_count
+    return BinaryTrees(np.concatenate(feature).astype(np.int32), _float32_floor(np.concatenate(threshold)),
+                       np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+                       np.concatenate(value).astype(np.float64), np.asarray(roots, dtype=np.int32),
+                       scale, np.asarray(bias, dtype=np.float64))
+
+
+def _xgboost(est):
+    booster = est.get_booster()
+    dump = json.loads(booster.save_raw('json'))['learner']
+    objective = dump['objective']['name']
+    if objective not in XGB_IDENTITY_OBJECTIVES:
+        raise ValueError(f"XGBoost objective {objective} is not supported")
+    gbm = dump['gradient_booster']
+    if gbm['name'] != 'gbtree':
+        raise ValueError(f"XGBoost booster {gbm['name']} is not supported")
+    params = dump['learner_model_param']
+    n_out = max(int(params.get('num_target', '1')), 1)
+    base_score = [float(v) for v in params['base_score'].strip('[]').split(',')]
+    trees = gbm['model']['trees']
+    tree_info = gbm['model']['tree_info']
+    best_iteration = getattr(est, 'best_iteration', None)
+    if best_iteration is not None:
+        indptr = gbm['model']['iteration_indptr']
+        trees = trees[:indptr[best_iteration + 1]]
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for i, tree in enumerate(trees):
+        lc = np.asarray(tree['left_children'])
+        rc = np.asarray(tree['right_children'])
+        leaf = lc < 0
+        own = np.arange(len(lc)) + offset
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        roots.append(offset)
+        feature.append(np.where(leaf, -1, tree['split_indices']))
+        # XGBoost sends x < t left; for float32 x that is x <= the next float32 below t
+        threshold.append(np.nextafter(conditions, np.float32(-np.inf)))
+        left.append(np.where(leaf, own, lc + offset))
+        right.append(np.where(leaf, own, rc + offset))
+        leaf_size = int(tree['tree_param'].get('size_leaf_vector', '1') or 1)
+        node_value = np.zeros((len(lc), n_out))
+        if leaf_size > 1:
+            node_value[:] = np.asarray(tree['base_weights'], dtype=np.float64).reshape(len(lc), leaf_size)
+        else:
+            node_value[:, tree_info[i]] = conditions
+        value.append(np.where(leaf[:, None], node_value, 0.0))
+        offset += len(lc)
+    bias = np.broadcast_to(np.asarray(base_score, dtype=np.float64), (n_out,)).copy()
+    return BinaryTrees(np.concatenate(feature).astype(np.int32), np.concatenate(threshold).astype(np.float32),
+                       np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+                       np.concatenate(value), np.asarray(roots, dtype=np.int32), 1.0, bias)
+
+
+def compile_estimator(est):
+    """Compile one (possibly multi-output) regressor into a BinaryTrees/ObliviousTrees ensemble."""
+    name = type(est).__name__
+    if name == 'CatBoostRegressor':
+        return _catboost(est)
+    if name in ('XGBRegressor', 'XGBRFRegressor'):
+        return _xgboost(est)
+    if name in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        n_out = est.estimators_[0].tree_.value.shape[1]
+        return _sklearn_trees(est.estimators_, 1.0 / len(est.estimators_), np.zeros(n_out))
+    if name == 'GradientBoostingRegressor':
+        if type(est.init_).__name__ != 'DummyRegressor' or est.loss not in ('squared_error', 'absolute_error', 'huber', 'quantile'):
+            raise ValueError("Only GradientBoostingRegressor with the default init is supported")
+        return _sklearn_trees(est.estimators_[:, 0], est.learning_rate, np.ravel(est.init_.constant_))
+    if name == 'DecisionTreeRegressor':
+        return _sklearn_trees([est], 1.0, np.zeros(est.tree_.value.shape[1]))
+    raise TypeError(f"Cannot compile {name}")
+
+
+def compile_model(model):
+    """Compile a fitted model (or MultiOutputRegressor of models) into a CompiledModel."""
+    if type(model).__name__ == 'MultiOutputRegressor':
+        ensembles = [(compile_estimator(est), np.array([j])) for j, est in enumerate(model.estimators_)]
+        n_outputs = len(model.estimators_)
+    else:
+        ensemble = compile_estimator(model)
+        ensembles = [(ensemble, np.arange(ensemble.n_outputs))]
+        n_outputs = ensemble.n_outputs
+    try:
+        feature_names = model_feature_names(model)
+    except ValueError:
+        # Fit on a bare array: fall back to positional names
+        feature_names = [f'f{i}' for i in range(model.n_features_in_)]
+    return CompiledModel(ensembles, feature_names, n_outputs, source=type(model).__name__)
+
+
+def probe_matrix(compiled, n_rows=5000, seed=0):
+    """Rows whose values sit exactly on, just below and just above the model's split points."""
+    rng = np.random.default_rng(seed)
+    candidates = [[0.0, 1.0] for _ in compiled.feature_names_]
+    for ensemble, _ in compiled.ensembles:
+        if isinstance(ensemble, BinaryTrees):
+            pairs = zip(ensemble.feature[ensemble.feature >= 0], ensemble.threshold[ensemble.feature >= 0])
+        else:
+            finite = np.isfinite(ensemble.split_border)
+            pairs = zip(ensemble.split_feature[finite], ensemble.split_border[finite])
+        for f, t in pairs:
+            candidates[f].append(t)
+    X = np.empty((n_rows, len(candidates)), dtype=np.float32)
+    for f, values in enumerate(candidates):
+        values = np.unique(_float32_floor(values))
+        values = np.concatenate([values, np.nextafter(values, np.float32(np.inf)),
+                                 np.nextafter(values, np.float32(-np.inf))])
+        X[:, f] = rng.choice(values, size=n_rows)
+    return X
+
+
+def check_parity(model, compiled, X):
+    """Max absolute difference between the original and compiled predictions on X."""
+    with warnings.catch_warnings():
+        # sklearn warns when a model fit on a DataFrame is given a bare array
+        warnings.simplefilter('ignore')
+        expected = np.asarray(model.predict(X), dtype=np.float64).reshape(len(X), -1)
+    return float(np.abs(compiled.predict(X) - expected).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile a persisted tree model to a NumPy .npz artifact.')
+    parser.add_argument('model', help='path to a joblib model')
+    parser.add_argument('-o', '--output', help='output .npz path (default: alongside the model)')
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='max allowed absolute difference from the original model (grams)')
+    parser.add_argument('--probe-rows', type=int, default=5000)
+    parser.add_argument('--mapped', action='store_true', help='write the memory-mapped .mmap format')
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model)
+    try:
+        compiled = compile_model(model)
+    except (TypeError, ValueError) as e:
+        raise SystemExit(f"Cannot compile {args.model}: {e}")
+    max_diff = check_parity(model, compiled, probe_matrix(compiled, args.probe_rows))
+    print(f"Parity on {args.probe_rows} probe rows: max |diff| = {max_diff:.2e}")
+    if max_diff > args.tolerance:
+        raise SystemExit(f"Compiled model deviates from the original by {max_diff:.2e} > {args.tolerance:.0e}; not saved")
+    output = args.output or os.path.splitext(args.model)[0] + ('.mmap' if args.mapped else '.npz')
+    if args.mapped:
+        with open(args.model, 'rb') as f:
+            # Lets predict.build_shared_weights see that the file is up to date
+            compiled.save_mapped(output, source_checksum=hashlib.sha256(f.read()).hexdigest())
+    else:
+        compiled.save(output)
+    print(f"Compiled model saved to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()